@@ -1,36 +1,130 @@
 import os 
+import atexit
+import hashlib
+import functools
+import select
 import subprocess
-import tempfile
 from openai import OpenAI
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
+# Environment variables are loaded from this .env file on first use
 env_path = '../.env'
 
-load_dotenv(env_path)
-api_key = os.getenv('OPENAI_API_KEY')
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """Load .env and build the OpenAI client once, on first use rather than at import."""
+    load_dotenv(env_path)
+    return OpenAI(api_key=os.getenv('OPENAI_API_KEY'), timeout=30.0)
 
-client = OpenAI(api_key=api_key, timeout=30.0)
+# Prolog side of the persistent validator: reads code("...") requests from stdin
+# and answers "valid"/"invalid" on stdout, one line per request. The code is
+# loaded like consult/1 (directives run, ops apply, clauses are added); any
+# error printed while loading makes it invalid, as --on-error=status does for
+# the one-shot run. Output of the loaded code is discarded so it can't be
+# mistaken for the reply.
+VALIDATOR_GOAL = (
+    "assertz((user:message_hook(_, error, _) :- nb_setval(validator_failed, true), fail)), "
+    "repeat, read_term(user_input, Request, []), "
+    "( Request == end_of_file -> halt ; true ), "
+    "Request = code(Text), "
+    "nb_setval(validator_failed, false), "
+    "( catch(with_output_to(string(_), setup_call_cleanup(open_string(Text, S), "
+    "load_files(validator_tmp, [stream(S), silent(true)]), close(S))), _, fail), "
+    "nb_getval(validator_failed, false) "
+    "-> writeln(valid) ; writeln(invalid) ), "
+    "catch(unload_file(validator_tmp), _, true), "
+    "flush_output, fail"
+)
 
-def validate_prolog_syntax(prolog_code):
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.pl', delete=False) as f:
-        f.write(prolog_code)
-        temp_file = f.name
-    
+_validator = None
+VALIDATOR_TIMEOUT = 10  # seconds to wait for a reply, like the one-shot swipl run
+
+def _get_validator():
+    """Start the swipl validator process on first use (or after it died)."""
+    global _validator
+    if _validator is None or _validator.poll() is not None:
+        _validator = subprocess.Popen(
+            ['swipl', '-q', '-g', VALIDATOR_GOAL, '-t', 'halt'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+    return _validator
+
+@atexit.register
+def _close_validator():
+    if _validator is not None and _validator.poll() is None:
+        _validator.stdin.close()
+        _validator.wait(timeout=5)
+
+def _prolog_string(text):
+    """Quote text as a Prolog string literal."""
+    escaped = text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+    return f'"{escaped}"'
+
+def _validate_once(prolog_code):
+    """Validate by piping the code into a fresh swipl process (no temp file)."""
     result = subprocess.run(
-        ['swipl', '-q', '-t', 'halt', temp_file],
+        ['swipl', '-q', '--on-error=status', '-g', 'catch((consult(user), halt), _, halt(1))'],
+        input=prolog_code,
         capture_output=True,
         text=True,
         timeout=10
     )
-    
-    os.unlink(temp_file)
     return result.returncode == 0
 
+# Validation results keyed by a blake2b digest of the code; swipl's verdict is
+# deterministic, so identical code (e.g. a repeated LLM reply) is checked once
+_validation_cache = {}
+VALIDATION_CACHE_SIZE = 256
+
+def validate_prolog_syntax(prolog_code):
+    key = hashlib.blake2b(prolog_code.encode(), digest_size=16).hexdigest()
+    if key in _validation_cache:
+        return _validation_cache[key]
+    
+    is_valid = _validate_uncached(prolog_code)
+    if len(_validation_cache) >= VALIDATION_CACHE_SIZE:
+        # Evict the oldest entry
+        del _validation_cache[next(iter(_validation_cache))]
+    _validation_cache[key] = is_valid
+    return is_valid
+
+def _reset_validator():
+    """Kill a stalled validator; the next call starts a fresh one."""
+    global _validator
+    if _validator is not None:
+        _validator.kill()
+        _validator.wait()
+        _validator = None
+
+def _validate_uncached(prolog_code):
+    # Reuse one swipl process instead of paying fork+exec+tempfile per call
+    try:
+        validator = _get_validator()
+        validator.stdin.write(f"code({_prolog_string(prolog_code)}).\n")
+        validator.stdin.flush()
+        # Wait for the reply with a deadline, so a stalled swipl can't hang the caller
+        ready, _, _ = select.select([validator.stdout], [], [], VALIDATOR_TIMEOUT)
+        if ready:
+            reply = validator.stdout.readline().strip()
+        else:
+            _reset_validator()
+            reply = ""
+    except (OSError, ValueError):
+        reply = ""
+    
+    if reply in ("valid", "invalid"):
+        return reply == "valid"
+    # Validator could not start, died or stalled mid-request
+    return _validate_once(prolog_code)
+
 def generate_and_validate_prolog():
     try:
         print("API Client Connected")
-        response = client.chat.completions.create(
+        response = _get_client().chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a Prolog expert. Generate only valid Prolog code."},
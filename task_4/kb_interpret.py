@@ -6,8 +6,51 @@ about Regular Show characters and their relationships.
 """
 
 import os
+import re
 from pyswip import Prolog
 
+# Sample queries as (tag, goal, variables to report). Yes/no goals use once/1
+# so Prolog stops at the first proof.
+SAMPLE_QUERIES = [
+    ("workers", "park_worker(X)", ["X"]),
+    ("boss", "boss(X)", ["X"]),
+    ("reports", "reports_to(mordecai, X)", ["X"]),
+    ("in_charge", "in_charge_of(benson, X)", ["X"]),
+    ("friendship", "once(friends(mordecai, rigby))", []),
+    ("char_types", "character_type(X, Y)", ["X", "Y"]),
+    ("authorities", "has_authority(X)", ["X"]),
+    ("subordinates", "is_subordinate(X)", ["X"]),
+    ("coworkers", "work_together(mordecai, X)", ["X"]),
+    ("mm_friends", "friends(muscle_man, X)", ["X"]),
+    ("relationships", "in_charge_of(Boss, Worker)", ["Boss", "Worker"]),
+]
+
+def run_batched(prolog, queries):
+    """
+    Run every query in a single findall/3 call instead of one pyswip query
+    each, and return {tag: [bindings, ...]} like list(prolog.query(goal)).
+    """
+    entries = []
+    for i, (tag, goal, variables) in enumerate(queries):
+        # All goals share one Prolog term, so give each its own variable names
+        for var in variables:
+            goal = re.sub(rf"\b{var}\b", f"{var}_{i}", goal)
+        values = ", ".join(f"{var}_{i}" for var in variables)
+        entries.append(f"[{tag}, ({goal}), [{values}]]")
+    
+    batch = f"findall([Tag, Values], (member([Tag, Goal, Values], [{', '.join(entries)}]), call(Goal)), All)"
+    solutions = prolog.query(batch)
+    try:
+        rows = next(solutions)["All"]
+    finally:
+        solutions.close()
+    
+    variables = {tag: names for tag, _, names in queries}
+    results = {tag: [] for tag in variables}
+    for tag, values in rows:
+        results[str(tag)].append(dict(zip(variables[str(tag)], map(str, values))))
+    return results
+
 def main():
     # Initialize Prolog
     prolog = Prolog()
@@ -16,37 +59,39 @@ def main():
     kb_path = os.path.abspath("regular_show_kb.pl")
     prolog.consult(kb_path)
     
+    # Run all sample queries in one Prolog call
+    results = run_batched(prolog, SAMPLE_QUERIES)
+    
     # Sample Query 1: List all park workers using the park_worker predicate
-    workers = list(prolog.query("park_worker(X)"))
+    workers = results["workers"]
     for worker in workers:
         print(f"  • {worker['X'].capitalize()}")
     print()
     
     # Sample Query 2: Who is the boss?
     print("Query 2: Who is the boss?")
-    boss_result = list(prolog.query("boss(X)"))
+    boss_result = results["boss"]
     for boss in boss_result:
         print(f"  • {boss['X'].capitalize()}")
     print()
     
     # Sample Query 3: Who does Mordecai report to?
     print("Query 3: Who does Mordecai report to?")
-    reports = list(prolog.query("reports_to(mordecai, X)"))
+    reports = results["reports"]
     for report in reports:
         print(f"  • Mordecai reports to {report['X'].capitalize()}")
     print()
     
     # Sample Query 4: Who is Benson in charge of? (using the rule)
     print("Query 4: Who is Benson in charge of? (using in_charge_of rule)")
-    in_charge = list(prolog.query("in_charge_of(benson, X)"))
+    in_charge = results["in_charge"]
     for person in in_charge:
         print(f"  • {person['X'].capitalize()}")
     print()
     
     # Sample Query 5: Are Mordecai and Rigby friends?
     print("Query 5: Are Mordecai and Rigby friends?")
-    friendship = list(prolog.query("friends(mordecai, rigby)"))
-    if friendship:
+    if results["friendship"]:
         print("  • Yes, they are friends!")
     else:
         print("  • No, they are not friends.")
@@ -54,42 +99,42 @@ def main():
     
     # Sample Query 6: What type of character is each person?
     print("Query 6: What type of character is everyone?")
-    char_types = list(prolog.query("character_type(X, Y)"))
+    char_types = results["char_types"]
     for char in char_types:
         print(f"  • {char['X'].capitalize()} is a {char['Y'].replace('_', ' ')}")
     print()
     
     # Sample Query 7: Who has authority?
     print("Query 7: Who has authority? (using has_authority rule)")
-    authorities = list(prolog.query("has_authority(X)"))
+    authorities = results["authorities"]
     for auth in authorities:
         print(f"  • {auth['X'].capitalize()}")
     print()
     
     # Sample Query 8: Who are subordinates?
     print("Query 8: Who are subordinates? (using is_subordinate rule)")
-    subordinates = list(prolog.query("is_subordinate(X)"))
+    subordinates = results["subordinates"]
     for sub in subordinates:
         print(f"  • {sub['X'].capitalize()}")
     print()
     
     # Sample Query 9: Who works together with Mordecai?
     print("Query 9: Who works together with Mordecai? (using work_together rule)")
-    coworkers = list(prolog.query("work_together(mordecai, X)"))
+    coworkers = results["coworkers"]
     for coworker in coworkers:
         print(f"  • {coworker['X'].capitalize()}")
     print()
     
     # Sample Query 10: Who are Muscle Man's friends?
     print("Query 10: Who are Muscle Man's friends?")
-    mm_friends = list(prolog.query("friends(muscle_man, X)"))
+    mm_friends = results["mm_friends"]
     for friend in mm_friends:
         print(f"  • {friend['X'].replace('_', ' ').title()}")
     print()
     
     #Complex query - Find all boss-worker pairs
     print("Complex Query: Show all boss-worker relationships")
-    relationships = list(prolog.query("in_charge_of(Boss, Worker)"))
+    relationships = results["relationships"]
     for rel in relationships:
         boss_name = rel['Boss'].capitalize()
         worker_name = rel['Worker'].capitalize()
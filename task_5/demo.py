@@ -4,10 +4,17 @@ Quick demo of Logic-LM capabilities
 Shows various types of queries and reasoning
 """
 
-from logic_lm import LogicLM
+from logic_lm import LogicLM, summarize_traces
+import asyncio
 import os
 import sys
 
+
+async def reason_all(logic_lm, demos):
+    """Answer each category in one batched request, all categories concurrently."""
+    return await asyncio.gather(*[logic_lm.abatch_reason(demo["questions"]) for demo in demos])
+
+
 def main():
     """Run a comprehensive demo of Logic-LM."""
     
@@ -19,7 +26,7 @@ def main():
     print("Paper: https://arxiv.org/abs/2305.12295")
   
     
-    logic_lm = LogicLM(kb_path=kb_path, model="gpt-4")
+    logic_lm = LogicLM(kb_path=kb_path)
     
     # Demo queries organized by type
     demos = [
@@ -53,14 +60,17 @@ def main():
         }
     ]
     
-    # Run demos
-    for demo in demos:
+    # Batch each category into one request and run categories concurrently
+    category_results = asyncio.run(reason_all(logic_lm, demos))
+    
+    for demo, results in zip(demos, category_results):
         print("\n" + "="*80)
         print(demo["category"])
         print("="*80)
         
-        for question in demo["questions"]:
-            result = logic_lm.reason(question, verbose=True)
+        for question, result in zip(demo["questions"], results):
+            print(f"\nQuestion: {question}")
+            print(f"Answer: {result['final_answer']}")
             
             # Show reasoning summary
             if result["success"]:
@@ -70,15 +80,14 @@ def main():
                 print(f"     Result Count: {len(result['attempts'][-1]['results'])}")
     
     # Final summary
+    stats = summarize_traces(logic_lm.history)
     print("Demo Complete!")
-    print(f"\nTotal questions processed: {len(logic_lm.history)}")
-    successful = sum(1 for r in logic_lm.history if r['success'])
-    print(f"Successful: {successful}/{len(logic_lm.history)}")
+    print(f"\nTotal questions processed: {stats['total']}")
+    print(f"Successful: {stats['successful']}/{stats['total']}")
     
     # Show self-refinement stats
-    refinements = sum(1 for r in logic_lm.history if len(r['attempts']) > 1)
-    if refinements > 0:
-        print(f"Questions requiring refinement: {refinements}")
+    if stats["refined"] > 0:
+        print(f"Questions requiring refinement: {stats['refined']}")
 
 
 
@@ -8,62 +8,35 @@ to perform faithful logical reasoning on the Regular Show knowledge base.
 """
 
 import os
+import re
 import sys
-from typing import List, Dict, Tuple, Optional
+import json
+import asyncio
+import hashlib
+import shelve
+import atexit
+import functools
+import itertools
+import threading
+from typing import List, Dict, Set, Tuple, Optional
 from pyswip import Prolog
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
-# Load environment variables from root .env file
+# Root .env file, loaded lazily by load_env()
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
-load_dotenv(env_path)
 
+# On-disk cache of LLM outputs (translations/answers are deterministic at temperature 0)
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.logic_lm_cache')
 
-class LogicLM:
-    """
-    Logic-LM: Integrates LLM with symbolic solver (Prolog) for logical reasoning.
-    
-    Pipeline:
-    1. Natural language question -> LLM -> Prolog query
-    2. Execute Prolog query on knowledge base
-    3. If error, self-refine using error messages
-    4. Return natural language answer
-    """
-    
-    def __init__(self, kb_path: str, model: str = "gpt-4", max_refinements: int = 3):
-        """
-        Initialize Logic-LM system.
-        
-        Args:
-            kb_path: Path to Prolog knowledge base file
-            model: OpenAI model to use
-            max_refinements: Maximum number of self-refinement attempts
-        """
-        self.kb_path = os.path.abspath(kb_path)
-        self.model = model
-        self.max_refinements = max_refinements
-        
-        # Initialize Prolog solver
-        self.prolog = Prolog()
-        self._load_knowledge_base()
-        
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Track reasoning history
-        self.history: List[Dict] = []
-    
-    def _load_knowledge_base(self):
-        """Load the Prolog knowledge base."""
-        try:
-            self.prolog.consult(self.kb_path)
-            print(f"✓ Loaded knowledge base: {self.kb_path}")
-        except Exception as e:
-            raise RuntimeError(f"Failed to load knowledge base: {e}")
-    
-    def _get_kb_schema(self) -> str:
-        """Get the schema/structure of the knowledge base for LLM context."""
-        return """
+# Prolog variables: identifiers starting with an uppercase letter or underscore
+_VARIABLE_RE = re.compile(r"\b[A-Z_]\w*")
+
+# Markdown code fences (```prolog ... ```) around an LLM-produced query
+_FENCE_RE = re.compile(r"^\s*```(?:prolog)?\s*|\s*```\s*$", re.M)
+
+# Static prompt pieces, built once at import instead of on every LLM call
+_KB_SCHEMA = """
 Knowledge Base Schema (Regular Show):
 
 Facts:
@@ -85,23 +58,160 @@ Available individuals:
 - benson (boss)
 - pops (park manager)
 """
-    
-    def translate_to_prolog(self, question: str, error_msg: Optional[str] = None) -> str:
-        """
-        Use LLM to translate natural language question to Prolog query.
-        
-        Args:
-            question: Natural language question
-            error_msg: Optional error message from previous attempt (for refinement)
-            
-        Returns:
-            Prolog query string
-        """
-        system_prompt = f"""You are an expert at translating natural language questions into Prolog queries.
 
-{self._get_kb_schema()}
+# Worked examples of the whole pipeline. Together with the schema they form the
+# static prefix of every system prompt, long enough (1024+ tokens) and
+# byte-identical across translate and format calls for OpenAI prompt caching.
+_CANONICAL_EXAMPLES = """Canonical examples (question, Prolog query, query results, answer):
 
-Guidelines:
+Q: "Who are the park workers?"
+Query: park_worker(X)
+Results: [{'X': 'mordecai'}, {'X': 'rigby'}, {'X': 'skips'}, {'X': 'muscle_man'}, {'X': 'hi_five_ghost'}]
+Answer: The park workers are Mordecai, Rigby, Skips, Muscle Man and Hi Five Ghost.
+
+Q: "Is Mordecai friends with Rigby?"
+Query: friends(mordecai, rigby)
+Results: [{}]
+Answer: Yes, Mordecai and Rigby are friends.
+
+Q: "Is Mordecai friends with Skips?"
+Query: friends(mordecai, skips)
+Results: []
+Answer: No, Mordecai and Skips are not friends.
+
+Q: "Who is the boss?"
+Query: boss(X)
+Results: [{'X': 'benson'}]
+Answer: Benson is the boss.
+
+Q: "Who is the park manager?"
+Query: park_manager(X)
+Results: [{'X': 'pops'}]
+Answer: Pops is the park manager.
+
+Q: "What type of character is Rigby?"
+Query: character_type(rigby, X)
+Results: [{'X': 'raccoon'}]
+Answer: Rigby is a raccoon.
+
+Q: "What kind of character is Benson?"
+Query: character_type(benson, X)
+Results: [{'X': 'gumball_machine'}]
+Answer: Benson is a gumball machine.
+
+Q: "Which character is a yeti?"
+Query: character_type(X, yeti)
+Results: [{'X': 'skips'}]
+Answer: Skips is a yeti.
+
+Q: "Is anyone a ghost?"
+Query: character_type(X, ghost)
+Results: [{'X': 'hi_five_ghost'}]
+Answer: Yes, Hi Five Ghost is a ghost.
+
+Q: "Who does Rigby report to?"
+Query: reports_to(rigby, X)
+Results: [{'X': 'benson'}]
+Answer: Rigby reports to Benson.
+
+Q: "Who reports to Benson?"
+Query: reports_to(X, benson)
+Results: [{'X': 'mordecai'}, {'X': 'rigby'}, {'X': 'skips'}, {'X': 'muscle_man'}, {'X': 'hi_five_ghost'}]
+Answer: Mordecai, Rigby, Skips, Muscle Man and Hi Five Ghost report to Benson.
+
+Q: "Who reports to Pops?"
+Query: reports_to(X, pops)
+Results: [{'X': 'benson'}]
+Answer: Benson reports to Pops.
+
+Q: "Does Benson report to anyone?"
+Query: reports_to(benson, X)
+Results: [{'X': 'pops'}]
+Answer: Yes, Benson reports to Pops.
+
+Q: "Who does Pops manage?"
+Query: in_charge_of(pops, X)
+Results: [{'X': 'benson'}]
+Answer: Pops is in charge of Benson.
+
+Q: "Who is in charge of Mordecai?"
+Query: in_charge_of(X, mordecai)
+Results: [{'X': 'benson'}]
+Answer: Benson is in charge of Mordecai.
+
+Q: "Who has authority in the park?"
+Query: has_authority(X)
+Results: [{'X': 'benson'}, {'X': 'pops'}]
+Answer: Benson and Pops have authority in the park.
+
+Q: "Does Skips have authority?"
+Query: has_authority(skips)
+Results: []
+Answer: No, Skips does not have authority.
+
+Q: "Is Pops a subordinate?"
+Query: is_subordinate(pops)
+Results: []
+Answer: No, Pops does not report to anyone.
+
+Q: "Is Rigby a subordinate?"
+Query: is_subordinate(rigby)
+Results: [{}]
+Answer: Yes, Rigby reports to someone.
+
+Q: "Is Benson a park worker?"
+Query: park_worker(benson)
+Results: []
+Answer: No, Benson is not a park worker.
+
+Q: "Who is Muscle Man friends with?"
+Query: friends(muscle_man, X)
+Results: [{'X': 'hi_five_ghost'}]
+Answer: Muscle Man is friends with Hi Five Ghost.
+
+Q: "Who are Rigby's friends?"
+Query: friends(rigby, X)
+Results: [{'X': 'mordecai'}]
+Answer: Rigby is friends with Mordecai.
+
+Q: "Do Mordecai and Skips work together?"
+Query: work_together(mordecai, skips)
+Results: [{}]
+Answer: Yes, Mordecai and Skips work together.
+
+Q: "Who works with Rigby?"
+Query: work_together(rigby, X)
+Results: [{'X': 'mordecai'}, {'X': 'skips'}, {'X': 'muscle_man'}, {'X': 'hi_five_ghost'}]
+Answer: Rigby works with Mordecai, Skips, Muscle Man and Hi Five Ghost.
+
+Q: "List all the park workers."
+Query: findall(X, park_worker(X), List)
+Results: [{'X': Variable(...), 'List': ['mordecai', 'rigby', 'skips', 'muscle_man', 'hi_five_ghost']}]
+Answer: The park workers are Mordecai, Rigby, Skips, Muscle Man and Hi Five Ghost.
+
+Q: "How many park workers are there?"
+Query: findall(X, park_worker(X), L), length(L, N)
+Results: [{'X': Variable(...), 'L': ['mordecai', 'rigby', 'skips', 'muscle_man', 'hi_five_ghost'], 'N': 5}]
+Answer: There are 5 park workers.
+
+Q: "Which park workers are not friends with Mordecai?"
+Query: park_worker(X), X \\= mordecai, \\+ friends(mordecai, X)
+Results: [{'X': 'skips'}, {'X': 'muscle_man'}, {'X': 'hi_five_ghost'}]
+Answer: Skips, Muscle Man and Hi Five Ghost are not friends with Mordecai.
+
+Q: "Is any boss also a park worker?"
+Query: boss(X), park_worker(X)
+Results: []
+Answer: No, none of the bosses is a park worker.
+"""
+
+_STATIC_PREFIX_INTRO = (
+    "You are part of Logic-LM, a system that answers natural language questions about a "
+    "Prolog knowledge base: questions are translated into Prolog queries, the queries are "
+    "run by SWI-Prolog, and the query results are phrased as natural language answers."
+)
+
+_TRANSLATION_INSTRUCTIONS = """Guidelines:
 1. Return ONLY the Prolog query, nothing else
 2. Use lowercase for atoms (mordecai, not Mordecai)
 3. Use uppercase for variables (X, Y, Boss, Worker)
@@ -125,9 +235,8 @@ A: in_charge_of(benson, X)
 Q: "Does Mordecai report to anyone?"
 A: reports_to(mordecai, X)
 """
-        
-        if error_msg:
-            system_prompt += f"""
+
+_REFINEMENT_PROMPT = """
 
 PREVIOUS ATTEMPT FAILED WITH ERROR:
 {error_msg}
@@ -138,46 +247,512 @@ Please revise the query to fix this error. Common fixes:
 - Verify predicate exists in schema
 - Check argument order
 """
+
+_FORMAT_SYSTEM_PROMPT = """You are an expert at interpreting Prolog query results and formatting them as natural language answers.
+
+Guidelines:
+1. Provide a clear, concise answer to the question
+2. If results are empty, say "No" or "None found"
+3. If results contain variables, list them clearly
+4. For yes/no questions, answer clearly
+5. Be conversational and natural
+"""
+
+# Bound on a single translation: the {"query": "..."} object around a query on
+# this schema is well under 60 tokens, so this only cuts off runaway generations.
+# No stop sequences: they could end the JSON early (e.g. "Q:" inside an atom)
+_TRANSLATE_MAX_TOKENS = 160
+
+# Structured output for single translations: the model must reply {"query": "..."}
+_QUERY_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "prolog_out",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"query": {"type": "string"}},
+            "required": ["query"],
+            "additionalProperties": False
+        }
+    }
+}
+
+
+@functools.lru_cache(maxsize=1)
+def load_env():
+    """Load environment variables from the root .env file (once, on first use)."""
+    load_dotenv(env_path)
+
+
+# Open LLM response shelves by path, shared by every LogicLM using that cache:
+# dbm allows one writer per file, so a second shelve.open of the same path
+# (another instance in this process) would fail on the file lock
+_SHELVES: Dict[str, shelve.Shelf] = {}
+_SHELF_USERS: Dict[str, int] = {}
+_SHELVES_LOCK = threading.RLock()
+
+
+def _open_shelf(path: str) -> Optional[shelve.Shelf]:
+    """
+    Return the shared shelf for path, opening it on first use.
+    
+    Returns None if the file is locked by another process; the caller then
+    caches in memory only.
+    """
+    with _SHELVES_LOCK:
+        if path not in _SHELVES:
+            try:
+                _SHELVES[path] = shelve.open(path)
+            except Exception as e:
+                print(f"⚠ LLM cache {path} unavailable, caching in memory only: {e}")
+                return None
+            _SHELF_USERS[path] = 0
+        _SHELF_USERS[path] += 1
+        return _SHELVES[path]
+
+
+def _release_shelf(path: str):
+    """Drop one user of a shared shelf, closing it when nobody uses it anymore."""
+    with _SHELVES_LOCK:
+        if path not in _SHELF_USERS:
+            return  # Already closed at exit
+        _SHELF_USERS[path] -= 1
+        if not _SHELF_USERS[path]:
+            del _SHELF_USERS[path]
+            _SHELVES.pop(path).close()
+
+
+@atexit.register
+def _close_shelves():
+    with _SHELVES_LOCK:
+        for shelf in _SHELVES.values():
+            shelf.close()
+        _SHELVES.clear()
+        _SHELF_USERS.clear()
+
+
+# OpenAI clients shared by every LogicLM instance, so connection pools and
+# TLS sessions are reused instead of renegotiated per instance
+_SHARED_CLIENT: Optional[OpenAI] = None
+_SHARED_ASYNC_CLIENT: Optional[AsyncOpenAI] = None
+
+
+def _get_client() -> OpenAI:
+    """Return the process-wide OpenAI client, creating it on first use."""
+    global _SHARED_CLIENT
+    if _SHARED_CLIENT is None:
+        load_env()
+        _SHARED_CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=60, max_retries=3)
+    return _SHARED_CLIENT
+
+
+def _get_async_client() -> AsyncOpenAI:
+    """Return the process-wide AsyncOpenAI client, creating it on first use."""
+    global _SHARED_ASYNC_CLIENT
+    if _SHARED_ASYNC_CLIENT is None:
+        load_env()
+        _SHARED_ASYNC_CLIENT = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=60, max_retries=3)
+    return _SHARED_ASYNC_CLIENT
+
+
+def summarize_traces(traces: List[Dict]) -> Dict[str, float]:
+    """
+    Aggregate reasoning traces in a single pass.
+    
+    Args:
+        traces: Reasoning traces (e.g. LogicLM.history)
+        
+    Returns:
+        Dictionary with total, successful, refined, attempts and success_rate
+    """
+    total = successful = refined = attempts = 0
+    for trace in traces:
+        n = len(trace["attempts"])
+        total += 1
+        successful += trace["success"]
+        refined += n > 1
+        attempts += n
+    return {
+        "total": total,
+        "successful": successful,
+        "refined": refined,
+        "attempts": attempts,
+        "success_rate": successful / total if total else 0.0
+    }
+
+
+class TruncatedTranslationError(RuntimeError):
+    """A translation hit _TRANSLATE_MAX_TOKENS before its JSON object was complete."""
+
+
+class LogicLM:
+    """
+    Logic-LM: Integrates LLM with symbolic solver (Prolog) for logical reasoning.
+    
+    Pipeline:
+    1. Natural language question -> LLM -> Prolog query
+    2. Execute Prolog query on knowledge base
+    3. If error, self-refine using error messages
+    4. Return natural language answer
+    """
+    
+    # pyswip drives a single global SWI-Prolog engine, so a KB file only has to
+    # be consulted once per process; keyed by (path, mtime, size) to catch edits
+    _consulted_kbs: Set[Tuple[str, float, int]] = set()
+    
+    def __init__(self, kb_path: str, model: str = "gpt-4o", max_refinements: int = 3,
+                 translate_model: str = "gpt-4o-mini", format_model: str = "gpt-4o-mini",
+                 cache_path: Optional[str] = DEFAULT_CACHE_PATH, use_llm_formatter: bool = False,
+                 speculative_temperatures: Tuple[float, ...] = (0.0, 0.7)):
+        """
+        Initialize Logic-LM system.
+        
+        Args:
+            kb_path: Path to Prolog knowledge base file
+            model: OpenAI model used for refinement (after a query has failed)
+            max_refinements: Maximum number of self-refinement attempts
+            translate_model: OpenAI model used for first-attempt translations
+            format_model: OpenAI model used to phrase answers
+            cache_path: Path of the on-disk LLM response cache (None disables it)
+            use_llm_formatter: Phrase answers with the LLM instead of local templates
+            speculative_temperatures: Temperatures of the translations areason() races per attempt
+        """
+        self.kb_path = os.path.abspath(kb_path)
+        self.model = model
+        self.translate_model = translate_model
+        self.format_model = format_model
+        self.max_refinements = max_refinements
+        self.use_llm_formatter = use_llm_formatter
+        self.speculative_temperatures = speculative_temperatures
+        
+        # System prompts = shared static prefix + task-specific suffix, so the
+        # prefix is cached server-side across translate and format calls
+        self._static_prefix = f"{_STATIC_PREFIX_INTRO}\n{self._get_kb_schema()}\n{_CANONICAL_EXAMPLES}"
+        self._base_system_prompt = (
+            f"{self._static_prefix}\n"
+            "You are an expert at translating natural language questions into Prolog queries.\n\n"
+            f"{_TRANSLATION_INSTRUCTIONS}"
+        )
+        self._format_system_prompt = f"{self._static_prefix}\n{_FORMAT_SYSTEM_PROMPT}"
+        self._schema_digest = hashlib.sha256(self._base_system_prompt.encode()).hexdigest()
+        
+        # LLM response cache: in-process dict in front of a persistent shelf
+        # (shared with other instances using the same path; see close())
+        self._memo: Dict[str, str] = {}
+        self._cache_path = os.path.abspath(cache_path) if cache_path else None
+        self._cache = _open_shelf(self._cache_path) if self._cache_path else None
+        
+        # Initialize Prolog solver
+        self.prolog = Prolog()
+        self._load_knowledge_base()
+        
+        # Shared OpenAI clients (sync for reason(), async for areason())
+        self.client = _get_client()
+        self.aclient = _get_async_client()
         
+        # Track reasoning history
+        self.history: List[Dict] = []
+    
+    def close(self):
+        """Release the on-disk cache (the shelf is closed once its last user is done)."""
+        if self._cache is not None:
+            self._cache = None
+            _release_shelf(self._cache_path)
+    
+    def __enter__(self) -> 'LogicLM':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _load_knowledge_base(self):
+        """Load the Prolog knowledge base (skipped if this exact file is already consulted)."""
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ],
-                temperature=0.0
-            )
+            key = (self.kb_path, os.path.getmtime(self.kb_path), os.path.getsize(self.kb_path))
+            if key in LogicLM._consulted_kbs:
+                return
+            self.prolog.consult(self.kb_path)
+            LogicLM._consulted_kbs.add(key)
+            print(f"✓ Loaded knowledge base: {self.kb_path}")
+        except Exception as e:
+            raise RuntimeError(f"Failed to load knowledge base: {e}")
+    
+    def _get_kb_schema(self) -> str:
+        """Get the schema/structure of the knowledge base for LLM context."""
+        return _KB_SCHEMA
+    
+    def _cache_key(self, model: str, *parts: str) -> str:
+        """Hash the model and prompt inputs into a cache key."""
+        return hashlib.sha256("|".join((model,) + parts).encode()).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Look up a cached LLM response, promoting disk hits into memory."""
+        if key in self._memo:
+            return self._memo[key]
+        if self._cache is not None:
+            with _SHELVES_LOCK:
+                value = self._cache.get(key)
+            if value is not None:
+                self._memo[key] = value
+                return value
+        return None
+    
+    def _cache_put(self, key: str, value: str):
+        """Store an LLM response in memory and on disk."""
+        self._memo[key] = value
+        if self._cache is not None:
+            with _SHELVES_LOCK:
+                self._cache[key] = value
+                self._cache.sync()
+    
+    def _translation_model(self, error_msg: Optional[str]) -> str:
+        """Cheap model for first attempts; escalate to self.model when refining."""
+        return self.model if error_msg else self.translate_model
+    
+    def _translation_key(self, question: str, error_msg: Optional[str]) -> str:
+        """Cache key of the deterministic (temperature 0) translation of a question."""
+        model = self._translation_model(error_msg)
+        return self._cache_key(model, "translate", question, error_msg or "", self._schema_digest)
+    
+    def _translation_messages(self, question: str, error_msg: Optional[str] = None) -> List[Dict]:
+        """Build the chat messages for translating a question into a Prolog query."""
+        system_prompt = self._base_system_prompt
+        
+        if error_msg:
+            system_prompt += _REFINEMENT_PROMPT.format(error_msg=error_msg)
+        
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ]
+    
+    @staticmethod
+    def _parse_query(content: str) -> str:
+        """Extract the Prolog query from a structured {"query": ...} reply."""
+        return json.loads(content)["query"].strip()
+    
+    @staticmethod
+    def _complete_query(buf: str) -> Optional[str]:
+        """Return the query once a streamed {"query": ...} object is complete, else None."""
+        if not buf.rstrip().endswith("}"):
+            return None
+        try:
+            return LogicLM._parse_query(buf)
+        except (ValueError, KeyError):
+            return None
+    
+    def _read_query_stream(self, stream) -> str:
+        """Consume a streamed translation, closing the stream as soon as the query is complete."""
+        buf = ""
+        finish_reason = None
+        try:
+            for chunk in stream:
+                if chunk.choices:
+                    buf += chunk.choices[0].delta.content or ""
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    query = self._complete_query(buf)
+                    if query is not None:
+                        return query
+        finally:
+            stream.close()
+        if finish_reason == "length":
+            raise TruncatedTranslationError(f"translation cut off at {_TRANSLATE_MAX_TOKENS} tokens: {buf!r}")
+        return self._parse_query(buf)
+    
+    async def _aread_query_stream(self, stream) -> str:
+        """Async variant of _read_query_stream."""
+        buf = ""
+        finish_reason = None
+        try:
+            async for chunk in stream:
+                if chunk.choices:
+                    buf += chunk.choices[0].delta.content or ""
+                    finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    query = self._complete_query(buf)
+                    if query is not None:
+                        return query
+        finally:
+            await stream.close()
+        if finish_reason == "length":
+            raise TruncatedTranslationError(f"translation cut off at {_TRANSLATE_MAX_TOKENS} tokens: {buf!r}")
+        return self._parse_query(buf)
+    
+    @staticmethod
+    def _clean_query(content: str) -> str:
+        """Strip whitespace and markdown code fences from an LLM-produced query."""
+        return _FENCE_RE.sub("", content).strip()
+    
+    def translate_to_prolog(self, question: str, error_msg: Optional[str] = None) -> str:
+        """
+        Use LLM to translate natural language question to Prolog query.
+        
+        Args:
+            question: Natural language question
+            error_msg: Optional error message from previous attempt (for refinement)
             
-            query = response.choices[0].message.content.strip()
-            # Remove any markdown code blocks
-            query = query.replace("```prolog", "").replace("```", "").strip()
+        Returns:
+            Prolog query string
             
+        Raises:
+            TruncatedTranslationError: if the reply hit the token limit (worth retrying)
+            RuntimeError: if the LLM call failed
+        """
+        model = self._translation_model(error_msg)
+        key = self._translation_key(question, error_msg)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=self._translation_messages(question, error_msg),
+                temperature=0.0,
+                response_format=_QUERY_RESPONSE_FORMAT,
+                max_tokens=_TRANSLATE_MAX_TOKENS,
+                stream=True
+            )
+            query = self._read_query_stream(stream)
+            self._cache_put(key, query)
             return query
             
+        except TruncatedTranslationError:
+            raise
         except Exception as e:
             raise RuntimeError(f"LLM translation failed: {e}")
     
-    def execute_query(self, query: str) -> Tuple[bool, List[Dict], Optional[str]]:
+    async def atranslate_to_prolog(self, question: str, error_msg: Optional[str] = None,
+                                   temperature: float = 0.0) -> str:
+        """
+        Async variant of translate_to_prolog using the AsyncOpenAI client.
+        
+        Only deterministic (temperature 0) translations are cached; sampled
+        ones are used by areason() for speculative alternatives.
+        """
+        model = self._translation_model(error_msg)
+        key = self._translation_key(question, error_msg)
+        cached = self._cache_get(key) if temperature == 0.0 else None
+        if cached is not None:
+            return cached
+        
+        try:
+            stream = await self.aclient.chat.completions.create(
+                model=model,
+                messages=self._translation_messages(question, error_msg),
+                temperature=temperature,
+                response_format=_QUERY_RESPONSE_FORMAT,
+                max_tokens=_TRANSLATE_MAX_TOKENS,
+                stream=True
+            )
+            query = await self._aread_query_stream(stream)
+            if temperature == 0.0:
+                self._cache_put(key, query)
+            return query
+            
+        except TruncatedTranslationError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"LLM translation failed: {e}")
+    
+    def execute_query(self, query: str, limit: Optional[int] = None) -> Tuple[bool, List[Dict], Optional[str]]:
         """
         Execute Prolog query on the knowledge base.
         
         Args:
             query: Prolog query string
+            limit: Maximum number of solutions to collect (None for all); a
+                warning is printed when the query had more
             
         Returns:
             (success, results, error_message)
         """
         try:
-            results = list(self.prolog.query(query))
+            solutions = self.prolog.query(query)
+            try:
+                # One extra solution tells whether the limit cut anything off
+                results = list(itertools.islice(solutions, None if limit is None else limit + 1))
+                if limit is not None and len(results) > limit:
+                    print(f"⚠ {query}: more than {limit} solutions, keeping the first {limit}")
+                    del results[limit:]
+            finally:
+                # Release the Prolog query frame now rather than at garbage collection
+                solutions.close()
             return True, results, None
         except Exception as e:
             error_msg = str(e)
             return False, [], error_msg
     
+    def _format_messages(self, question: str, query: str, results: List[Dict]) -> List[Dict]:
+        """Build the chat messages for turning Prolog results into an answer."""
+        user_prompt = f"""Question: {question}
+
+Prolog Query: {query}
+
+Query Results: {results}
+
+Please provide a natural language answer to the question based on these results."""
+        
+        return [
+            {"role": "system", "content": self._format_system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    @staticmethod
+    def _fallback_format(results: List[Dict]) -> str:
+        """Simple formatting used when the LLM call fails."""
+        if not results:
+            return "No results found."
+        return str(results)
+    
+    @staticmethod
+    def _humanize(value) -> str:
+        """Render a Prolog value for an answer (muscle_man -> Muscle Man)."""
+        if isinstance(value, list):
+            return ", ".join(LogicLM._humanize(v) for v in value)
+        return str(value).replace("_", " ").title()
+    
+    @staticmethod
+    def format_locally(query: str, results: List[Dict]) -> str:
+        """
+        Format Prolog results into an answer without calling the LLM.
+        
+        Ground queries (friends(mordecai, rigby)) answer Yes/No; queries with
+        variables list the bindings, e.g. "Mordecai, Rigby, Skips".
+        
+        Args:
+            query: Prolog query that was executed
+            results: Results from Prolog query
+            
+        Returns:
+            Natural language answer
+        """
+        if not results:
+            return "None found." if _VARIABLE_RE.search(query) else "No."
+        
+        variables = list(dict.fromkeys(var for row in results for var in row))
+        if not variables:
+            return "Yes."
+        
+        # findall/setof/bagof: only the collected list is meaningful
+        list_vars = [var for var in variables if any(isinstance(row.get(var), list) for row in results)]
+        if list_vars:
+            variables = list_vars
+        
+        if len(variables) == 1:
+            values = dict.fromkeys(LogicLM._humanize(row[variables[0]]) for row in results)
+            return ", ".join(values) + "."
+        
+        rows = (", ".join(f"{var} = {LogicLM._humanize(row[var])}" for var in variables if var in row)
+                for row in results)
+        return "; ".join(dict.fromkeys(rows)) + "."
+    
     def format_results(self, question: str, query: str, results: List[Dict]) -> str:
         """
-        Use LLM to format Prolog results into natural language answer.
+        Format Prolog results into a natural language answer.
+        
+        Uses local templating (format_locally) unless use_llm_formatter is set,
+        in which case the LLM phrases the answer.
         
         Args:
             question: Original natural language question
@@ -187,41 +762,204 @@ Please revise the query to fix this error. Common fixes:
         Returns:
             Natural language answer
         """
-        system_prompt = """You are an expert at interpreting Prolog query results and formatting them as natural language answers.
-
-Guidelines:
-1. Provide a clear, concise answer to the question
-2. If results are empty, say "No" or "None found"
-3. If results contain variables, list them clearly
-4. For yes/no questions, answer clearly
-5. Be conversational and natural
-"""
+        if not self.use_llm_formatter:
+            return self.format_locally(query, results)
         
-        user_prompt = f"""Question: {question}
-
-Prolog Query: {query}
-
-Query Results: {results}
-
-Please provide a natural language answer to the question based on these results."""
+        key = self._cache_key(self.format_model, "format", question, query, repr(results))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.3
+                model=self.format_model,
+                messages=self._format_messages(question, query, results),
+                temperature=0.0
+            )
+            
+            answer = response.choices[0].message.content.strip()
+            self._cache_put(key, answer)
+            return answer
+            
+        except Exception as e:
+            # Fallback to simple formatting
+            return self._fallback_format(results)
+    
+    async def aformat_results(self, question: str, query: str, results: List[Dict]) -> str:
+        """Async variant of format_results using the AsyncOpenAI client."""
+        if not self.use_llm_formatter:
+            return self.format_locally(query, results)
+        
+        key = self._cache_key(self.format_model, "format", question, query, repr(results))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.format_model,
+                messages=self._format_messages(question, query, results),
+                temperature=0.0
             )
             
-            return response.choices[0].message.content.strip()
+            answer = response.choices[0].message.content.strip()
+            self._cache_put(key, answer)
+            return answer
             
         except Exception as e:
             # Fallback to simple formatting
-            if not results:
-                return "No results found."
-            return str(results)
+            return self._fallback_format(results)
+    
+    def _batch_translation_messages(self, questions: List[str]) -> List[Dict]:
+        """Build one chat request that translates several questions at once."""
+        system_prompt = self._base_system_prompt + """
+You will be given several numbered questions. Translate each one independently
+and reply with ONLY a JSON array of Prolog query strings, one per question, in order.
+"""
+        numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": numbered}
+        ]
+    
+    def _batch_format_messages(self, items: List[Tuple[str, str, List[Dict]]]) -> List[Dict]:
+        """Build one chat request that answers several (question, query, results) items."""
+        system_prompt = self._format_system_prompt + """
+You will be given several numbered items, each with a question, the Prolog query
+that was run and its results. Reply with ONLY a JSON array of answer strings,
+one per item, in order.
+"""
+        numbered = "\n\n".join(
+            f"{i}. Question: {question}\n   Prolog Query: {query}\n   Query Results: {results}"
+            for i, (question, query, results) in enumerate(items, 1)
+        )
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": numbered}
+        ]
+    
+    @staticmethod
+    def _parse_json_list(content: str, expected: int) -> List:
+        """Extract a JSON array with the expected number of items from an LLM reply."""
+        start, end = content.find("["), content.rfind("]")
+        items = json.loads(content[start:end + 1]) if start != -1 else None
+        if not isinstance(items, list) or len(items) != expected:
+            raise ValueError(f"expected a JSON array of {expected} items, got: {content!r}")
+        return items
+    
+    def translate_many(self, questions: List[str]) -> List[str]:
+        """
+        Translate several questions to Prolog queries with a single LLM call.
+        
+        Args:
+            questions: Natural language questions
+            
+        Returns:
+            Prolog query strings, in the same order as the questions
+        """
+        key = self._cache_key(self.translate_model, "translate_many", *questions, self._schema_digest)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return json.loads(cached)
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.translate_model,
+                messages=self._batch_translation_messages(questions),
+                temperature=0.0
+            )
+            content = response.choices[0].message.content
+            queries = [self._clean_query(q) for q in self._parse_json_list(content, len(questions))]
+        except Exception as e:
+            raise RuntimeError(f"LLM batch translation failed: {e}")
+        
+        self._cache_put(key, json.dumps(queries))
+        return queries
+    
+    async def atranslate_many(self, questions: List[str]) -> List[str]:
+        """Async variant of translate_many using the AsyncOpenAI client."""
+        key = self._cache_key(self.translate_model, "translate_many", *questions, self._schema_digest)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return json.loads(cached)
+        
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.translate_model,
+                messages=self._batch_translation_messages(questions),
+                temperature=0.0
+            )
+            content = response.choices[0].message.content
+            queries = [self._clean_query(q) for q in self._parse_json_list(content, len(questions))]
+        except Exception as e:
+            raise RuntimeError(f"LLM batch translation failed: {e}")
+        
+        self._cache_put(key, json.dumps(queries))
+        return queries
+    
+    def format_many(self, items: List[Tuple[str, str, List[Dict]]]) -> List[str]:
+        """
+        Format several query results into answers (one LLM call when use_llm_formatter is set).
+        
+        Args:
+            items: (question, prolog_query, results) tuples
+            
+        Returns:
+            Natural language answers, in the same order as the items
+        """
+        if not items:
+            return []
+        
+        if not self.use_llm_formatter:
+            return [self.format_locally(query, results) for _, query, results in items]
+        
+        key = self._cache_key(self.format_model, "format_many", repr(items))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return json.loads(cached)
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.format_model,
+                messages=self._batch_format_messages(items),
+                temperature=0.0
+            )
+            answers = [str(a).strip() for a in
+                       self._parse_json_list(response.choices[0].message.content, len(items))]
+        except Exception as e:
+            # Fallback to simple formatting
+            return [self._fallback_format(results) for _, _, results in items]
+        
+        self._cache_put(key, json.dumps(answers))
+        return answers
+    
+    async def aformat_many(self, items: List[Tuple[str, str, List[Dict]]]) -> List[str]:
+        """Async variant of format_many using the AsyncOpenAI client."""
+        if not items:
+            return []
+        
+        if not self.use_llm_formatter:
+            return [self.format_locally(query, results) for _, query, results in items]
+        
+        key = self._cache_key(self.format_model, "format_many", repr(items))
+        cached = self._cache_get(key)
+        if cached is not None:
+            return json.loads(cached)
+        
+        try:
+            response = await self.aclient.chat.completions.create(
+                model=self.format_model,
+                messages=self._batch_format_messages(items),
+                temperature=0.0
+            )
+            answers = [str(a).strip() for a in
+                       self._parse_json_list(response.choices[0].message.content, len(items))]
+        except Exception as e:
+            # Fallback to simple formatting
+            return [self._fallback_format(results) for _, _, results in items]
+        
+        self._cache_put(key, json.dumps(answers))
+        return answers
     
     def reason(self, question: str, verbose: bool = True) -> Dict:
         """
@@ -257,16 +995,20 @@ Please provide a natural language answer to the question based on these results.
             if verbose:
                 print("Translating to Prolog...")
             
-            prolog_query = self.translate_to_prolog(question, error_msg)
-            
-            if verbose:
-                print(f"  Prolog Query: {prolog_query}")
-            
-            # Step 2: Execute query
-            if verbose:
-                print("Executing query...")
-            
-            success, results, error_msg = self.execute_query(prolog_query)
+            try:
+                prolog_query = self.translate_to_prolog(question, error_msg)
+            except TruncatedTranslationError as e:
+                # Counts as a failed attempt, so the next one retries it
+                prolog_query, success, results, error_msg = "", False, [], str(e)
+            else:
+                if verbose:
+                    print(f"  Prolog Query: {prolog_query}")
+                
+                # Step 2: Execute query
+                if verbose:
+                    print("Executing query...")
+                
+                success, results, error_msg = self.execute_query(prolog_query)
             
             attempt_data = {
                 "attempt_num": attempt + 1,
@@ -309,6 +1051,222 @@ Please provide a natural language answer to the question based on these results.
         
         self.history.append(reasoning_trace)
         return reasoning_trace
+
+    async def _speculative_attempt(self, question: str, error_msg: Optional[str]
+                                   ) -> Tuple[str, bool, List[Dict], Optional[str]]:
+        """
+        Race one translation per speculative temperature and keep the first
+        query that executes successfully; the others are cancelled.
+        
+        A cached deterministic translation is used as is, without a race, so
+        reruns of known questions make no API calls.
+        
+        Returns:
+            (prolog_query, success, results, error_message) of the chosen candidate
+        """
+        if 0.0 in self.speculative_temperatures:
+            cached = self._cache_get(self._translation_key(question, error_msg))
+            if cached is not None:
+                return (cached,) + self.execute_query(cached)
+        
+        tasks = [
+            asyncio.ensure_future(self.atranslate_to_prolog(question, error_msg, temperature=t))
+            for t in self.speculative_temperatures
+        ]
+        outcome = None
+        tried = set()
+        translation_error = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    prolog_query = await next_done
+                except RuntimeError as e:
+                    translation_error = e
+                    continue
+                if prolog_query in tried:
+                    continue
+                tried.add(prolog_query)
+                
+                outcome = (prolog_query,) + self.execute_query(prolog_query)
+                if outcome[1]:
+                    break
+        finally:
+            # Stops the losing requests as soon as a winner has run
+            for task in tasks:
+                task.cancel()
+        
+        if outcome is None:
+            if isinstance(translation_error, TruncatedTranslationError):
+                # A failed attempt rather than an error, so areason() retries it
+                return "", False, [], str(translation_error)
+            raise translation_error
+        return outcome
+    
+    async def areason(self, question: str, verbose: bool = False) -> Dict:
+        """
+        Async variant of reason(): awaits the LLM calls so many questions can
+        be answered concurrently with asyncio.gather.
+        
+        Each attempt speculatively races translations at several temperatures
+        (see speculative_temperatures) and keeps the first one that runs, which
+        trades extra tokens for fewer sequential refinement round trips.
+        Prolog execution stays synchronous since it is local and fast.
+        
+        Args:
+            question: Natural language question
+            verbose: Whether to print intermediate steps (interleaves when concurrent)
+        
+        Returns:
+            Dictionary with reasoning trace and answer
+        """
+        reasoning_trace = {
+            "question": question,
+            "attempts": [],
+            "final_answer": None,
+            "success": False
+        }
+        
+        error_msg = None
+        
+        for attempt in range(self.max_refinements):
+            prolog_query, success, results, error_msg = await self._speculative_attempt(question, error_msg)
+            
+            if verbose:
+                print(f"[{question}] Attempt {attempt + 1}: {prolog_query} -> "
+                      f"{results if success else error_msg}")
+            
+            reasoning_trace["attempts"].append({
+                "attempt_num": attempt + 1,
+                "prolog_query": prolog_query,
+                "success": success,
+                "results": results,
+                "error": error_msg
+            })
+            
+            if success:
+                answer = await self.aformat_results(question, prolog_query, results)
+                reasoning_trace["final_answer"] = answer
+                reasoning_trace["success"] = True
+                self.history.append(reasoning_trace)
+                return reasoning_trace
+        
+        reasoning_trace["final_answer"] = f"Failed to answer after {self.max_refinements} attempts."
+        self.history.append(reasoning_trace)
+        return reasoning_trace
+    
+    def _execute_batch(self, questions: List[str], queries: List[str]) -> List[Dict]:
+        """Run each batched query once and build a reasoning trace per question."""
+        traces = []
+        for question, prolog_query in zip(questions, queries):
+            success, results, error_msg = self.execute_query(prolog_query)
+            traces.append({
+                "question": question,
+                "attempts": [{
+                    "attempt_num": 1,
+                    "prolog_query": prolog_query,
+                    "success": success,
+                    "results": results,
+                    "error": error_msg
+                }],
+                "final_answer": None,
+                "success": success
+            })
+        return traces
+    
+    @staticmethod
+    def _format_items(traces: List[Dict]) -> List[Tuple[str, str, List[Dict]]]:
+        """(question, query, results) for every successfully executed trace."""
+        return [
+            (t["question"], t["attempts"][-1]["prolog_query"], t["attempts"][-1]["results"])
+            for t in traces if t["success"]
+        ]
+    
+    def _record_answers(self, traces: List[Dict], answers: List[str]):
+        """Attach formatted answers to the successful traces and store them in history."""
+        solved = [t for t in traces if t["success"]]
+        for trace, answer in zip(solved, answers):
+            trace["final_answer"] = answer
+            self.history.append(trace)
+    
+    def batch_reason(self, questions: List[str], verbose: bool = False) -> List[Dict]:
+        """
+        Answer several questions with one translation call and one formatting call.
+        
+        Questions whose batched query fails in Prolog (or a batch whose
+        translation cannot be parsed) fall back to reason(), which runs the
+        usual self-refinement loop for each of them.
+        
+        Args:
+            questions: Natural language questions
+            verbose: Whether to print intermediate steps
+            
+        Returns:
+            Reasoning traces, in the same order as the questions
+        """
+        try:
+            queries = self.translate_many(questions)
+        except RuntimeError as e:
+            if verbose:
+                print(f"  ✗ Batch translation failed, answering one by one: {e}")
+            return [self.reason(q, verbose=verbose) for q in questions]
+        
+        traces = self._execute_batch(questions, queries)
+        self._record_answers(traces, self.format_many(self._format_items(traces)))
+        
+        if verbose:
+            for trace in traces:
+                print(f"  {trace['question']} -> {trace['attempts'][0]['prolog_query']}")
+        
+        return [t if t["success"] else self.reason(t["question"], verbose=verbose) for t in traces]
+    
+    async def abatch_reason(self, questions: List[str], verbose: bool = False) -> List[Dict]:
+        """Async variant of batch_reason; failed questions are refined concurrently."""
+        try:
+            queries = await self.atranslate_many(questions)
+        except RuntimeError as e:
+            if verbose:
+                print(f"  ✗ Batch translation failed, answering one by one: {e}")
+            return list(await asyncio.gather(*[self.areason(q, verbose=verbose) for q in questions]))
+        
+        traces = self._execute_batch(questions, queries)
+        self._record_answers(traces, await self.aformat_many(self._format_items(traces)))
+        
+        failed = [i for i, t in enumerate(traces) if not t["success"]]
+        retried = await asyncio.gather(*[self.areason(traces[i]["question"], verbose=verbose) for i in failed])
+        for i, trace in zip(failed, retried):
+            traces[i] = trace
+        return traces
+    
+    @staticmethod
+    def _normalize(results: List[Dict]) -> Tuple[str, ...]:
+        """Render Prolog solutions as hashable 'Var=value, ...' strings, one per solution."""
+        return tuple(", ".join(f"{var}={value}" for var, value in sorted(row.items())) for row in results)
+    
+    def reason_batch_sync(self, questions: List[str], chunk_size: int = 20) -> List[Dict]:
+        """
+        Fast path for large offline evaluation loops: answer questions in
+        batch_reason() chunks without printing, returning compact records.
+        
+        Args:
+            questions: Natural language questions
+            chunk_size: Questions per batched translation call
+            
+        Returns:
+            One {"question", "answer", "success", "attempts", "results"} record per
+            question, in order; results are normalized with _normalize()
+        """
+        records = []
+        for start in range(0, len(questions), chunk_size):
+            for trace in self.batch_reason(questions[start:start + chunk_size]):
+                last = trace["attempts"][-1]
+                records.append({
+                    "question": trace["question"],
+                    "answer": trace["final_answer"],
+                    "success": trace["success"],
+                    "attempts": len(trace["attempts"]),
+                    "results": self._normalize(last["results"]) if trace["success"] else ()
+                })
+        return records
     
     def interactive_mode(self):
         """Run Logic-LM in interactive mode."""
@@ -340,6 +1298,8 @@ Please provide a natural language answer to the question based on these results.
 
 def main():
     """Main function to demonstrate Logic-LM."""
+    load_env()
+    
     # Check for OpenAI API key
     if not os.getenv("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY not found in environment variables")
@@ -355,7 +1315,7 @@ def main():
     
     # Initialize Logic-LM
     print("\nInitializing Logic-LM...")
-    logic_lm = LogicLM(kb_path=kb_path, model="gpt-4")
+    logic_lm = LogicLM(kb_path=kb_path)
     
     # Demo questions
     demo_questions = [
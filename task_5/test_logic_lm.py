@@ -5,13 +5,14 @@ Quick test script for Logic-LM to verify setup
 
 import os
 import sys
-from logic_lm import LogicLM
+from logic_lm import LogicLM, load_env
 
 
 def test_logic_lm():
     """Test Logic-LM with a simple question."""
     
     # Check for API key
+    load_env()
     if not os.getenv("OPENAI_API_KEY"):
         print("❌ Error: OPENAI_API_KEY not found")
         print("Make sure it's set in the root .env file")
@@ -28,7 +29,7 @@ def test_logic_lm():
     try:
         # Initialize Logic-LM
         print("Initializing Logic-LM...")
-        logic_lm = LogicLM(kb_path=kb_path, model="gpt-4")
+        logic_lm = LogicLM(kb_path=kb_path)
         print("✓ Logic-LM initialized\n")
         
         # Test a simple question
@@ -5,110 +5,323 @@ This module implements a backward chaining inference engine that works
 with Prolog-like rules to prove hypotheses from a knowledge base.
 """
 
-from typing import List, Dict, Set, Tuple, Optional
+import sys
+from contextvars import ContextVar
+from typing import Iterator, List, Dict, Set, Tuple, Optional, Union
 from dataclasses import dataclass
-from copy import deepcopy
+
+
+# A term is a constant, a query variable ('?X') or a renamed rule variable: an
+# int, frame base + slot, where each rule invocation reserves a fresh block of
+# ids for its variables (so renaming never builds new variable names)
+Term = Union[str, int]
+
+# Trail of binding changes: (variable, previous value or None if it was unbound)
+Trail = List[Tuple[Term, Optional[Term]]]
+
+
+def _is_variable(term: Term) -> bool:
+    """True for '?'-prefixed query variables and integer rule variables."""
+    return term.__class__ is int or term[:1] == '?'
+
+
+def _term_str(term: Term) -> str:
+    """Display a term; rule variables are shown as ?_G<id>."""
+    if term.__class__ is int:
+        return f"?_G{term}"
+    return term
+
+
+# Trace lines of chainers that have no trace_sink go here when it is set (else to stdout).
+# A context variable, so concurrent callers (threads, asyncio tasks) each collect their own
+TRACE: ContextVar[Optional[List[str]]] = ContextVar('trace', default=None)
+
+
+class Bindings(dict):
+    """
+    Variable bindings (variable -> value) resolved union-find style.
+    
+    find() follows a chain of bindings to its end and then points every
+    variable on the way directly at that end (path compression), so later
+    lookups of the same variables take one hop.
+    
+    During search a single Bindings is mutated in place; every change is
+    recorded on a trail so undo() can restore it when backtracking.
+    """
+    
+    def find(self, term: str, trail: Optional[Trail] = None) -> str:
+        """Return the value a term is ultimately bound to (the term itself if unbound)."""
+        root = term
+        while root in self:
+            next_value = dict.__getitem__(self, root)
+            if next_value == root:
+                break
+            root = next_value
+        # Compress the path so every variable on it points at the root
+        while term != root and term in self:
+            next_value = dict.__getitem__(self, term)
+            if next_value != root:
+                if trail is not None:
+                    trail.append((term, next_value))
+                dict.__setitem__(self, term, root)
+            term = next_value
+        return root
+    
+    def bind(self, var: str, value: str, trail: Optional[Trail] = None):
+        """Bind an unbound variable (a union of its class with value's)."""
+        if trail is not None:
+            trail.append((var, None))
+        self[var] = value
+    
+    def unify(self, x: Term, y: Term, trail: Trail) -> bool:
+        """Unify two terms, binding whichever resolves to a variable."""
+        x = self.find(x, trail)
+        y = self.find(y, trail)
+        if x == y:
+            return True
+        if x.__class__ is int or x[:1] == '?':
+            self.bind(x, y, trail)
+        elif y.__class__ is int or y[:1] == '?':
+            self.bind(y, x, trail)
+        else:
+            return False
+        return True
+    
+    def undo(self, trail: Trail, mark: int):
+        """Roll back every change recorded on the trail after mark."""
+        while len(trail) > mark:
+            var, previous = trail.pop()
+            if previous is None:
+                del self[var]
+            else:
+                self[var] = previous
+    
+    def copy(self) -> 'Bindings':
+        return Bindings(self)
+
+
+class SymbolTable:
+    """
+    Dense integer ids for the predicate and constant names in use.
+    
+    Each distinct name is stored once and facts hold the stored string, so
+    equal names compare by identity; predicates also carry their id.
+    """
+    
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+    
+    def intern(self, name: str) -> int:
+        """Return the id of a name, assigning the next id the first time it is seen."""
+        symbol_id = self.ids.get(name)
+        if symbol_id is None:
+            symbol_id = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return symbol_id
+    
+    def canonical(self, name: str) -> str:
+        """Return the stored string for a name."""
+        return self.names[self.intern(name)]
+    
+    def __len__(self):
+        return len(self.names)
+
+
+# Shared by every knowledge base and query so that ids agree
+SYMBOLS = SymbolTable()
 
 
 @dataclass
 class Fact:
     """Represents a fact with a predicate and arguments."""
+    # Slots instead of a per-instance __dict__: search creates many short-lived facts
+    __slots__ = ('predicate', 'args', 'pred_id', '_is_var', '_is_ground', '_hash')
     predicate: str
     args: Tuple[str, ...]
     
     def __init__(self, predicate: str, *args: str):
-        self.predicate = predicate
-        self.args = args
+        self.pred_id = SYMBOLS.intern(predicate)
+        self.predicate = SYMBOLS.names[self.pred_id]
+        self.args = tuple(map(SYMBOLS.canonical, args))
+        self._is_var = tuple([arg[:1] == '?' for arg in self.args])
+        self._is_ground = True not in self._is_var
+        self._hash = hash((self.predicate, self.args))
+    
+    @classmethod
+    def _from_interned(cls, predicate: str, pred_id: int, args: Tuple[str, ...]) -> 'Fact':
+        """Build a fact from names that are already in the symbol table (skips interning)."""
+        fact = object.__new__(cls)
+        fact.pred_id = pred_id
+        fact.predicate = predicate
+        fact.args = args
+        fact._is_var = is_var = tuple([arg.__class__ is int or arg[:1] == '?' for arg in args])
+        fact._is_ground = True not in is_var
+        fact._hash = hash((predicate, args))
+        return fact
+    
+    def __reduce__(self):
+        # Rebuild through __init__ so names and pred_id come from this process's symbol table
+        return (Fact, (self.predicate, *self.args))
     
     def __hash__(self):
-        return hash((self.predicate, self.args))
+        return self._hash
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, Fact):
             return False
-        return self.predicate == other.predicate and self.args == other.args
+        return self.pred_id == other.pred_id and self.args == other.args
     
     def __repr__(self):
         if self.args:
-            return f"{self.predicate}({', '.join(self.args)})"
+            return f"{self.predicate}({', '.join(map(_term_str, self.args))})"
         return self.predicate
     
-    def substitute(self, bindings: Dict[str, str]) -> 'Fact':
+    def substitute(self, bindings: Dict[str, str], trail: Optional[Trail] = None) -> 'Fact':
         """Apply variable bindings to this fact, following chains of bindings."""
-        new_args = []
-        for arg in self.args:
-            # Follow the chain of bindings to get the final value
-            value = arg
-            seen = {arg}
-            while value in bindings:
-                if value in seen and value != arg:
-                    break  # Avoid infinite loops
-                next_value = bindings[value]
-                if next_value == value:
-                    break
-                seen.add(value)
-                value = next_value
-            new_args.append(value)
-        return Fact(self.predicate, *tuple(new_args))
-    
-    def _resolve_binding(self, var: str, bindings: Dict[str, str]) -> str:
-        """Follow the chain of bindings to get the final value."""
-        value = var
-        seen = {var}
-        while value in bindings:
-            next_value = bindings[value]
-            if next_value == value or next_value in seen:
-                break
-            seen.add(next_value)
-            value = next_value
-        return value
+        if not isinstance(bindings, Bindings):
+            bindings = Bindings(bindings)
+        # Nothing to substitute if no argument is a variable or none of them is
+        # bound (only variables are ever keys, so the constants can't collide)
+        if self._is_ground or bindings.keys().isdisjoint(self.args):
+            return self
+        return Fact._from_interned(self.predicate, self.pred_id, tuple([
+            bindings.find(arg, trail) if is_var else arg for arg, is_var in zip(self.args, self._is_var)
+        ]))
     
     def match(self, other: 'Fact', bindings: Optional[Dict[str, str]] = None) -> Optional[Dict[str, str]]:
         """
         Try to match this fact with another, returning variable bindings if successful.
-        Variables start with '?'
+        Variables start with '?'. If the match binds nothing new, the given
+        bindings are returned as they are (no copy is made).
         """
         if bindings is None:
-            bindings = {}
-        else:
-            bindings = bindings.copy()
-        
-        if self.predicate != other.predicate:
+            bindings = Bindings()
+        elif not isinstance(bindings, Bindings):
+            bindings = Bindings(bindings)
+        trail: Trail = []
+        if not self.unify(other, bindings, trail):
             return None
+        if not trail:
+            return bindings
+        # Copy only now that something changed, then restore the caller's bindings
+        result = bindings.copy()
+        bindings.undo(trail, 0)
+        return result
+    
+    def unify(self, other: 'Fact', bindings: Bindings, trail: Trail) -> bool:
+        """
+        Unify this fact with another in place, recording new bindings on the trail.
+        On failure the bindings are left exactly as they were.
+        """
+        if self.pred_id != other.pred_id:
+            return False
         
         if len(self.args) != len(other.args):
-            return None
+            return False
         
-        for self_arg, other_arg in zip(self.args, other.args):
-            # Resolve bindings for both arguments
-            resolved_self = self._resolve_binding(self_arg, bindings) if self_arg.startswith('?') else self_arg
-            resolved_other = self._resolve_binding(other_arg, bindings) if other_arg.startswith('?') else other_arg
+        mark = len(trail)
+        for self_arg, self_is_var, other_arg, other_is_var in zip(self.args, self._is_var,
+                                                                 other.args, other._is_var):
+            # Resolve bindings for both arguments (a bound variable may resolve to a constant)
+            if self_is_var:
+                resolved_self = bindings.find(self_arg, trail)
+                self_is_var = resolved_self.__class__ is int or resolved_self[:1] == '?'
+            else:
+                resolved_self = self_arg
+            if other_is_var:
+                resolved_other = bindings.find(other_arg, trail)
+                other_is_var = resolved_other.__class__ is int or resolved_other[:1] == '?'
+            else:
+                resolved_other = other_arg
             
             # If both are variables (after resolution)
-            if resolved_self.startswith('?') and resolved_other.startswith('?'):
+            if self_is_var and other_is_var:
                 if resolved_self != resolved_other:
                     # Bind one to the other
-                    bindings[resolved_self] = resolved_other
+                    bindings.bind(resolved_self, resolved_other, trail)
             # If resolved_self is a variable
-            elif resolved_self.startswith('?'):
-                bindings[resolved_self] = resolved_other
+            elif self_is_var:
+                bindings.bind(resolved_self, resolved_other, trail)
             # If resolved_other is a variable
-            elif resolved_other.startswith('?'):
-                bindings[resolved_other] = resolved_self
+            elif other_is_var:
+                bindings.bind(resolved_other, resolved_self, trail)
             # Both are constants
             else:
                 if resolved_self != resolved_other:
-                    return None
+                    bindings.undo(trail, mark)
+                    return False
         
-        return bindings
+        return True
+
+
+# Head unification ops of a compiled rule: (tag, goal arg slot, payload)
+GET_CONST = 0      # goal arg must unify with the constant payload
+GET_VAR = 1        # first occurrence of local variable payload: it aliases the goal arg
+GET_VAR_BOUND = 2  # repeated occurrence of local variable payload: unify with the goal arg
+
+
+@dataclass
+class CompiledRule:
+    """
+    A rule compiled against a frame of local variables 0..n_vars-1.
+    
+    head_ops unify the call's arguments with the head; body_calls are premise
+    templates (predicate, predicate id, args) whose int args index the frame.
+    A rule without variables needs no frame: ground_premises holds its premises.
+    """
+    head_ops: List[Tuple[int, int, Term]]
+    body_calls: List[Tuple[str, int, Tuple[Term, ...]]]
+    n_vars: int
+    ground_premises: Optional[List[Fact]] = None
 
 
 @dataclass
 class Rule:
     """Represents a rule: conclusion :- premise1, premise2, ..., premiseN"""
+    __slots__ = ('conclusion', 'premises', '_var_list', '_compiled')
     conclusion: Fact
     premises: List[Fact]
     
+    def __post_init__(self):
+        # A rule never changes once built, so its variables and compiled form
+        # are worked out here once instead of on every invocation
+        self._var_list: Tuple[Term, ...] = tuple(dict.fromkeys(
+            arg
+            for fact in [self.conclusion] + self.premises
+            for arg, is_var in zip(fact.args, fact._is_var) if is_var
+        ))
+        self._compiled = self.compile()
+    
+    def compile(self) -> CompiledRule:
+        """Compile the rule so a call can be resolved without renaming it first."""
+        local_vars = {var: index for index, var in enumerate(self._var_list)}
+        head_ops = []
+        seen: Set[Term] = set()
+        for slot, (arg, is_var) in enumerate(zip(self.conclusion.args, self.conclusion._is_var)):
+            if not is_var:
+                head_ops.append((GET_CONST, slot, arg))
+            elif arg in seen:
+                head_ops.append((GET_VAR_BOUND, slot, local_vars[arg]))
+            else:
+                seen.add(arg)
+                head_ops.append((GET_VAR, slot, local_vars[arg]))
+        
+        body_calls = [
+            (premise.predicate, premise.pred_id, tuple([local_vars[arg] if is_var else arg
+                                       for arg, is_var in zip(premise.args, premise._is_var)]))
+            for premise in self.premises
+        ]
+        
+        ground_premises = None if self._var_list else list(self.premises)
+        return CompiledRule(head_ops, body_calls, len(self._var_list), ground_premises)
+    
+    def __reduce__(self):
+        # The compiled form holds predicate ids, so recompile on load
+        return (Rule, (self.conclusion, self.premises))
+    
     def __repr__(self):
         if not self.premises:
             return f"{self.conclusion}"
@@ -116,20 +329,289 @@ class Rule:
         return f"{self.conclusion} :- {premises_str}"
 
 
+# Fact lists longer than this get per-argument indexes for goals whose first argument is unbound
+COLUMN_INDEX_THRESHOLD = 64
+
+
 class KnowledgeBase:
     """A knowledge base containing facts and rules."""
     
     def __init__(self):
         self.facts: Set[Fact] = set()
         self.rules: List[Rule] = []
+        self.symbols = SYMBOLS  # Names of all facts and rules (shared with queries)
+        # Indexes keyed by (predicate, arity), and by (predicate, arity, first argument)
+        # where a variable first argument is filed under None
+        self.facts_by_key: Dict[Tuple[str, int], List[Fact]] = {}
+        self.rules_by_key: Dict[Tuple[str, int], List[Rule]] = {}
+        self.first_arg_index: Dict[Tuple[str, int, Optional[str]], List[Fact]] = {}
+        self.rule_first_arg_index: Dict[Tuple[str, int, Optional[str]], List[Rule]] = {}
+        self._nonground_keys: Set[Tuple[str, int]] = set()  # Keys with a fact that has any variable
+        # Per-argument indexes of large fact lists, built on first use: key -> position -> value -> facts
+        self._column_indexes: Dict[Tuple[str, int], Dict[int, Dict[str, List[Fact]]]] = {}
+        # rules_for results by (predicate, arity, first argument), so a goal's candidate
+        # rules are merged once rather than on every call; cleared by add_rule
+        self._rules_for_cache: Dict[Tuple[str, int, str], List[Rule]] = {}
+        self.materialized: Optional[Set[Fact]] = None  # Cached closure from materialize()
     
     def add_fact(self, fact: Fact):
         """Add a fact to the knowledge base."""
+        if fact in self.facts:
+            return
         self.facts.add(fact)
+        self.materialized = None
+        key = (fact.predicate, len(fact.args))
+        self.facts_by_key.setdefault(key, []).append(fact)
+        self._column_indexes.pop(key, None)
+        if not fact._is_ground:
+            self._nonground_keys.add(key)
+        if fact.args:
+            first_arg = None if fact._is_var[0] else fact.args[0]
+            self.first_arg_index.setdefault(key + (first_arg,), []).append(fact)
     
     def add_rule(self, rule: Rule):
         """Add a rule to the knowledge base."""
         self.rules.append(rule)
+        self.materialized = None
+        self._rules_for_cache.clear()
+        conclusion = rule.conclusion
+        key = (conclusion.predicate, len(conclusion.args))
+        self.rules_by_key.setdefault(key, []).append(rule)
+        if conclusion.args:
+            first_arg = None if conclusion._is_var[0] else conclusion.args[0]
+            self.rule_first_arg_index.setdefault(key + (first_arg,), []).append(rule)
+    
+    def facts_for(self, goal: Fact) -> List[Fact]:
+        """
+        Facts that could match a goal: same predicate/arity and, if known, same
+        first argument (facts with that argument first, then those with a variable
+        there). A ground goal against ground facts is a set lookup, and large
+        fact lists are narrowed by any other ground argument of the goal.
+        """
+        key = (goal.predicate, len(goal.args))
+        if key not in self._nonground_keys and goal._is_ground:
+            return [goal] if goal in self.facts else []
+        if goal.args and not goal._is_var[0]:
+            return self._first_arg_lookup(self.first_arg_index, key, goal.args[0])
+        facts = self.facts_by_key.get(key, [])
+        if len(facts) > COLUMN_INDEX_THRESHOLD and key not in self._nonground_keys:
+            for position, is_var in enumerate(goal._is_var):
+                if not is_var:
+                    return self._column_index(key, position).get(goal.args[position], [])
+        return facts
+    
+    def has_only_ground_facts(self, goal: Fact) -> bool:
+        """True if no fact under the goal's predicate/arity has a variable."""
+        return (goal.predicate, len(goal.args)) not in self._nonground_keys
+    
+    def _column_index(self, key: Tuple[str, int], position: int) -> Dict[str, List[Fact]]:
+        """Index the (ground) facts under key by their argument at position."""
+        columns = self._column_indexes.setdefault(key, {})
+        index = columns.get(position)
+        if index is None:
+            index = columns[position] = {}
+            for fact in self.facts_by_key[key]:
+                index.setdefault(fact.args[position], []).append(fact)
+        return index
+    
+    def rules_for(self, goal: Fact) -> List[Rule]:
+        """
+        Rules whose conclusion has the goal's predicate and arity and, if the
+        goal's first argument is known, a matching first argument (rules with
+        that constant first, then those with a variable there).
+        """
+        key = (goal.predicate, len(goal.args))
+        if goal.args and not goal._is_var[0]:
+            lookup_key = key + (goal.args[0],)
+            rules = self._rules_for_cache.get(lookup_key)
+            if rules is None:
+                rules = self._rules_for_cache[lookup_key] = self._first_arg_lookup(
+                    self.rule_first_arg_index, key, goal.args[0])
+            return rules
+        return self.rules_by_key.get(key, [])
+    
+    @staticmethod
+    def _first_arg_lookup(index: Dict[tuple, list], key: Tuple[str, int], first_arg: str) -> list:
+        """Entries filed under a first argument plus those with a variable first argument."""
+        matching = index.get(key + (first_arg,), [])
+        variable = index.get(key + (None,))
+        return matching + variable if variable else matching
+    
+    def materialize(self) -> Set[Fact]:
+        """
+        Derive every fact the rules entail, bottom-up (semi-naive evaluation).
+        
+        Predicates are grouped into strongly connected components of the rule
+        dependency graph and evaluated dependencies first: rules of a
+        non-recursive component fire once, recursive components iterate, each
+        round joining only the facts new in the previous round. The result is
+        cached in self.materialized until a fact or rule is added.
+        
+        Returns:
+            Set of all ground facts: the stored facts plus everything derivable
+            
+        Raises:
+            ValueError: if a fact has variables or a rule is not range-restricted
+                (a head variable missing from its premises), since the closure
+                would then not be a finite set of ground facts
+        """
+        if self.materialized is not None:
+            return self.materialized
+        if self._nonground_keys:
+            raise ValueError("Cannot materialize a knowledge base with non-ground facts")
+        for rule in self.rules:
+            premise_vars = {arg for premise in rule.premises for arg in premise.args if _is_variable(arg)}
+            if any(_is_variable(arg) and arg not in premise_vars for arg in rule.conclusion.args):
+                raise ValueError(f"Cannot materialize rule that is not range-restricted: {rule}")
+        
+        relations: Dict[Tuple[str, int], Set[Tuple[str, ...]]] = {
+            key: {fact.args for fact in facts} for key, facts in self.facts_by_key.items()
+        }
+        for component in self._rule_components():
+            rules = [rule for key in component for rule in self.rules_by_key[key]]
+            recursive = len(component) > 1 or any(
+                (premise.predicate, len(premise.args)) in component for rule in rules for premise in rule.premises
+            )
+            
+            # First round joins the full relations; later rounds need a new fact in at least one premise
+            delta = self._add_derived(relations, [
+                (rule, head_args) for rule in rules for head_args in self._join(rule, relations, None, None, {})
+            ])
+            while recursive and delta:
+                derived = []
+                indexes = {}
+                for rule in rules:
+                    for position, premise in enumerate(rule.premises):
+                        new_rows = delta.get((premise.predicate, len(premise.args)))
+                        if new_rows:
+                            derived.extend((rule, head_args)
+                                           for head_args in self._join(rule, relations, position, new_rows, indexes))
+                delta = self._add_derived(relations, derived)
+        
+        self.materialized = {
+            Fact(predicate, *args) for (predicate, _), rows in relations.items() for args in rows
+        }
+        return self.materialized
+    
+    def _rule_components(self) -> List[Set[Tuple[str, int]]]:
+        """Strongly connected components of the rule predicates, dependencies first (Tarjan)."""
+        graph = {
+            key: {(premise.predicate, len(premise.args)) for rule in rules for premise in rule.premises
+                  if (premise.predicate, len(premise.args)) in self.rules_by_key}
+            for key, rules in self.rules_by_key.items()
+        }
+        order: Dict[Tuple[str, int], int] = {}
+        lowlink: Dict[Tuple[str, int], int] = {}
+        stack: List[Tuple[str, int]] = []
+        on_stack: Set[Tuple[str, int]] = set()
+        components = []
+        
+        def visit(key):
+            order[key] = lowlink[key] = len(order)
+            stack.append(key)
+            on_stack.add(key)
+            for dependency in graph[key]:
+                if dependency not in order:
+                    visit(dependency)
+                    lowlink[key] = min(lowlink[key], lowlink[dependency])
+                elif dependency in on_stack:
+                    lowlink[key] = min(lowlink[key], order[dependency])
+            if lowlink[key] == order[key]:
+                component = set()
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.add(member)
+                    if member == key:
+                        break
+                components.append(component)
+        
+        for key in graph:
+            if key not in order:
+                visit(key)
+        return components
+    
+    @staticmethod
+    def _join(rule: Rule, relations: Dict[Tuple[str, int], Set[Tuple[str, ...]]],
+              delta_position: Optional[int], delta_rows: Optional[Set[Tuple[str, ...]]],
+              indexes: Dict[tuple, Dict[Tuple[str, ...], List[Tuple[str, ...]]]]) -> Iterator[Tuple[str, ...]]:
+        """
+        Join a rule's premises against the relations and yield the head args of
+        every match. If delta_position is given, that premise only ranges over
+        delta_rows (the facts new in the last round) and is joined first. Each
+        other premise is looked up in a hash index on the argument positions
+        already bound when it is reached; indexes caches these for the round.
+        """
+        premises = rule.premises
+        if delta_position is None:
+            order = list(range(len(premises)))
+        else:
+            order = [delta_position] + [i for i in range(len(premises)) if i != delta_position]
+        
+        # Argument positions of each premise that are bound by constants or earlier premises
+        bound_positions = []
+        seen_vars: Set[str] = set()
+        for i in order:
+            premise = premises[i]
+            bound_positions.append(tuple([position for position, (arg, is_var) in
+                                          enumerate(zip(premise.args, premise._is_var))
+                                          if not is_var or arg in seen_vars]))
+            seen_vars.update(arg for arg, is_var in zip(premise.args, premise._is_var) if is_var)
+        
+        def candidates(step, binding):
+            if order[step] == delta_position:
+                return delta_rows
+            premise = premises[order[step]]
+            key = (premise.predicate, len(premise.args))
+            positions = bound_positions[step]
+            if not positions:
+                return relations.get(key, ())
+            index_key = key + (positions,)
+            table = indexes.get(index_key)
+            if table is None:
+                table = indexes[index_key] = {}
+                for row in relations.get(key, ()):
+                    table.setdefault(tuple([row[position] for position in positions]), []).append(row)
+            args = premise.args
+            return table.get(tuple([binding[args[position]] if premise._is_var[position] else args[position]
+                                    for position in positions]), ())
+        
+        def extend(step, binding):
+            if step == len(order):
+                yield tuple([binding[arg] if is_var else arg
+                             for arg, is_var in zip(rule.conclusion.args, rule.conclusion._is_var)])
+                return
+            premise = premises[order[step]]
+            for row in candidates(step, binding):
+                extended = binding
+                for arg, is_var, value in zip(premise.args, premise._is_var, row):
+                    if not is_var:
+                        if arg != value:
+                            break
+                    elif arg in extended:
+                        if extended[arg] != value:
+                            break
+                    else:
+                        if extended is binding:
+                            extended = dict(binding)
+                        extended[arg] = value
+                else:
+                    yield from extend(step + 1, extended)
+        
+        return extend(0, {})
+    
+    @staticmethod
+    def _add_derived(relations: Dict[Tuple[str, int], Set[Tuple[str, ...]]],
+                     derived: List[Tuple[Rule, Tuple[str, ...]]]) -> Dict[Tuple[str, int], Set[Tuple[str, ...]]]:
+        """Add derived head args to the relations and return the ones that were new."""
+        delta: Dict[Tuple[str, int], Set[Tuple[str, ...]]] = {}
+        for rule, head_args in derived:
+            key = (rule.conclusion.predicate, len(head_args))
+            rows = relations.setdefault(key, set())
+            if head_args not in rows:
+                rows.add(head_args)
+                delta.setdefault(key, set()).add(head_args)
+        return delta
     
     def __repr__(self):
         result = "Facts:\n"
@@ -141,171 +623,333 @@ class KnowledgeBase:
         return result
 
 
+def _match_ground_rows(goal: Fact, facts: List[Fact]) -> Iterator[Tuple[Fact, List[Tuple[Term, str]]]]:
+    """
+    Scan ground facts for those matching a goal whose variables are all
+    unbound, yielding each match with the (variable, value) bindings it implies.
+    
+    The match plan (constant positions, first and repeated variable positions)
+    is worked out once per scan, so each fact costs a few tuple lookups rather
+    than a full unification.
+    """
+    constants = []
+    first_vars = []
+    repeats = []
+    first_position: Dict[Term, int] = {}
+    for position, (arg, is_var) in enumerate(zip(goal.args, goal._is_var)):
+        if not is_var:
+            constants.append((position, arg))
+        elif arg in first_position:
+            repeats.append((position, first_position[arg]))
+        else:
+            first_position[arg] = position
+            first_vars.append((arg, position))
+    
+    for fact in facts:
+        args = fact.args
+        for position, value in constants:
+            if args[position] != value:
+                break
+        else:
+            for position, first in repeats:
+                if args[position] != args[first]:
+                    break
+            else:
+                yield fact, [(var, args[position]) for var, position in first_vars]
+
+
 class BackwardChainer:
     """Implements backward chaining inference."""
     
-    def __init__(self, kb: KnowledgeBase, trace: bool = False, max_depth: int = 50):
+    def __init__(self, kb: KnowledgeBase, trace: bool = False, max_depth: int = 50,
+                 trace_sink: Optional[List[str]] = None):
         self.kb = kb
         self.trace = trace
+        self.trace_sink = trace_sink  # If set, trace lines are appended here instead of printed
         self.trace_depth = 0
         self.proved_goals: Set[Fact] = set()
-        self.rule_counter = 0
+        self.rule_counter = 0  # Number of rule invocations so far
+        self.frame_base = 0  # First variable id of the next rule invocation
         self.max_depth = max_depth  # Maximum recursion depth
         self.current_goals: List[Fact] = []  # Stack of goals currently being proved (for cycle detection)
+        self.current_goals_set: Set[Fact] = set()  # Same goals, for O(1) membership tests
+        # Answer table: goal variant -> ground answer args, filled once a goal is fully evaluated
+        self._answer_table: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[str, ...]]] = {}
+        self._prune_count = 0  # Cycle/depth cuts so far; a goal whose subtree was cut is not tabled
     
     def _trace_print(self, message: str):
-        """Print a trace message with proper indentation."""
+        """Print (or collect in trace_sink / TRACE) a trace message with proper indentation."""
         if self.trace:
-            print("  " * self.trace_depth + message)
+            line = "  " * self.trace_depth + message
+            sink = self.trace_sink if self.trace_sink is not None else TRACE.get()
+            if sink is not None:
+                sink.append(line)
+            else:
+                print(line)
     
-    def _rename_rule_variables(self, rule: Rule) -> Rule:
+    def _resolve_head(self, compiled: CompiledRule, goal: Fact, bindings: Bindings,
+                      trail: Trail) -> Optional[List[Fact]]:
         """
-        Rename all variables in a rule to avoid collisions with query variables.
-        Creates a fresh copy of the rule with renamed variables.
+        Unify a goal with a compiled rule head by running its head ops.
+        
+        Each invocation gets a fresh frame of variable ids frame_base + slot, so
+        rule variables never collide with query variables or other invocations;
+        head variables simply alias the goal's arguments. Returns the premises
+        instantiated with the frame, or None if the head does not unify (the
+        caller undoes any partial bindings).
         """
         self.rule_counter += 1
-        suffix = f"_{self.rule_counter}"
+        if compiled.n_vars:
+            frame_base = self.frame_base
+            self.frame_base += compiled.n_vars
+            frame: List[Term] = list(range(frame_base, self.frame_base))
         
-        # Find all variables in the rule
-        variables = set()
-        variables.update(arg for arg in rule.conclusion.args if arg.startswith('?'))
-        for premise in rule.premises:
-            variables.update(arg for arg in premise.args if arg.startswith('?'))
-        
-        # Create renaming map
-        renaming = {var: var + suffix for var in variables}
+        for tag, slot, payload in compiled.head_ops:
+            arg = goal.args[slot]
+            if goal._is_var[slot]:
+                arg = bindings.find(arg, trail)
+            if tag == GET_VAR:
+                frame[payload] = arg
+            elif tag == GET_CONST:
+                if arg.__class__ is int or arg[:1] == '?':
+                    bindings.bind(arg, payload, trail)
+                elif arg != payload:
+                    return None
+            elif not bindings.unify(frame[payload], arg, trail):
+                return None
         
-        # Apply renaming
-        new_conclusion = Fact(
-            rule.conclusion.predicate,
-            *[renaming.get(arg, arg) for arg in rule.conclusion.args]
-        )
-        new_premises = [
-            Fact(premise.predicate, *[renaming.get(arg, arg) for arg in premise.args])
-            for premise in rule.premises
+        if compiled.ground_premises is not None:
+            # Nothing was renamed, so the premises are used as they are
+            return compiled.ground_premises
+        return [
+            Fact._from_interned(predicate, pred_id,
+                                tuple([frame[arg] if arg.__class__ is int else arg for arg in args]))
+            for predicate, pred_id, args in compiled.body_calls
         ]
-        
-        return Rule(new_conclusion, new_premises)
     
-    def backchain_to_goal(self, hypothesis: Fact, bindings: Optional[Dict[str, str]] = None) -> List[Dict[str, str]]:
+    @staticmethod
+    def _table_key(goal: Fact) -> Tuple[str, Tuple[str, ...]]:
+        """
+        Key a goal by its variant: variables are numbered by first occurrence,
+        so parent(?X, alice) and parent(?_G7, alice) share one table entry.
+        """
+        numbering: Dict[Term, str] = {}
+        args = []
+        for arg, is_var in zip(goal.args, goal._is_var):
+            if is_var:
+                if arg not in numbering:
+                    numbering[arg] = f"?{len(numbering)}"
+                arg = numbering[arg]
+            args.append(arg)
+        return goal.predicate, tuple(args)
+    
+    def backchain_to_goal(self, hypothesis: Fact, bindings: Optional[Dict[str, str]] = None,
+                          trail: Optional[Trail] = None) -> List[Dict[str, str]]:
         """
         Backward chain to prove a hypothesis.
         
         Args:
             hypothesis: The goal/hypothesis to prove
             bindings: Current variable bindings
+            trail: Trail of the ongoing search; when given, bindings is mutated in
+                place and restored before returning (omit it for a top-level call)
             
         Returns:
             List of binding dictionaries that prove the hypothesis (empty list if unprovable)
         """
-        if bindings is None:
-            bindings = {}
-        
-        self._trace_print(f"Goal: {hypothesis.substitute(bindings)}")
+        if trail is None:
+            # Top-level call: search on a private copy of the caller's bindings
+            return [self._export_bindings(solution)
+                    for solution in self._solve(hypothesis, Bindings(bindings or {}), [])]
+        return [solution.copy() for solution in self._solve(hypothesis, bindings, trail)]
+    
+    def _suspend_goal(self):
+        """Leave the goal on top of the goal stack while its caller works with a solution."""
+        self.current_goals_set.remove(self.current_goals.pop())
+        self.trace_depth -= 1
+    
+    def _resume_goal(self, goal: Fact):
+        """Re-enter a suspended goal to look for its next solution."""
         self.trace_depth += 1
+        self.current_goals.append(goal)
+        self.current_goals_set.add(goal)
+    
+    def _solve(self, hypothesis: Fact, bindings: Bindings, trail: Trail) -> Iterator[Bindings]:
+        """
+        Lazily enumerate the solutions of a hypothesis.
         
-        results = []
-        
-        # Apply current bindings to hypothesis
-        bound_hypothesis = hypothesis.substitute(bindings)
-        
-        # Check depth limit to prevent infinite recursion
-        if self.trace_depth > self.max_depth:
-            self._trace_print(f"✗ Max depth reached: {bound_hypothesis}")
-            self.trace_depth -= 1
-            return []
-        
-        # Check for cycles - if we're already trying to prove this goal
-        if bound_hypothesis in self.current_goals:
-            self._trace_print(f"✗ Cycle detected: {bound_hypothesis}")
-            self.trace_depth -= 1
-            return []
-        
-        # Check if this goal has already been proved
-        if bound_hypothesis in self.proved_goals:
-            self._trace_print(f"Already proved: {bound_hypothesis}")
-            self.trace_depth -= 1
-            return [bindings]
-        
-        # Add to current goals (cycle detection)
-        self.current_goals.append(bound_hypothesis)
-        
-        # Step 1: Check if the hypothesis matches any known facts
-        for fact in self.kb.facts:
-            # Try to unify the hypothesis with the fact
-            match_bindings = hypothesis.match(fact, bindings)
-            if match_bindings is not None:
-                self._trace_print(f"✓ Matched fact: {fact}")
-                matched_hypothesis = hypothesis.substitute(match_bindings)
-                self.proved_goals.add(matched_hypothesis)
-                results.append(match_bindings)
-            elif self.trace and fact.predicate == hypothesis.predicate:
-                # Debug: show why match failed for same predicate
-                pass  # Silently skip to avoid clutter
-        
-        # Step 2: Try to prove using rules (backward chain through rules)
-        for rule in self.kb.rules:
-            # Rename rule variables to avoid collisions with query variables
-            renamed_rule = self._rename_rule_variables(rule)
+        Each solution is yielded as the live bindings (extended in place); they
+        are undone when the generator is resumed, exhausted or closed, so copy
+        them to keep a solution beyond the next step.
+        """
+        entry_mark = len(trail)
+        try:
+            # Apply current bindings to hypothesis
+            bound_hypothesis = hypothesis.substitute(bindings, trail)
             
-            # Try to match the hypothesis with the rule's conclusion
-            match_bindings = hypothesis.match(renamed_rule.conclusion, bindings)
-            if match_bindings is not None:
-                self._trace_print(f"Trying rule: {rule}")
-                
-                # Try to prove all premises of the rule
-                premise_results = self._prove_premises(renamed_rule.premises, match_bindings)
-                
-                if premise_results:
-                    self._trace_print(f"✓ Rule succeeded: {rule}")
-                    matched_hypothesis = hypothesis.substitute(match_bindings)
-                    self.proved_goals.add(matched_hypothesis)
-                    results.extend(premise_results)
+            if self.trace:
+                self._trace_print(f"Goal: {bound_hypothesis}")
+            self.trace_depth += 1
+            
+            # Check depth limit to prevent infinite recursion
+            if self.trace_depth > self.max_depth:
+                self._trace_print(f"✗ Max depth reached: {bound_hypothesis}")
+                self._prune_count += 1
+                self.trace_depth -= 1
+                return
+            
+            # Check for cycles - if we're already trying to prove this goal
+            if bound_hypothesis in self.current_goals_set:
+                self._trace_print(f"✗ Cycle detected: {bound_hypothesis}")
+                self._prune_count += 1
+                self.trace_depth -= 1
+                return
+            
+            # Check if this goal has already been proved
+            if bound_hypothesis in self.proved_goals:
+                self._trace_print(f"Already proved: {bound_hypothesis}")
+                if not bound_hypothesis._is_ground:
+                    self._prune_count += 1  # Variables were left unbound, so this is not a full answer set
+                self.trace_depth -= 1
+                yield bindings
+                return
+            
+            # Reuse the answers of an identical goal that was already fully evaluated
+            table_key = self._table_key(bound_hypothesis)
+            if table_key in self._answer_table:
+                answers = self._answer_table[table_key]
+                self._trace_print(f"Tabled: {bound_hypothesis} ({len(answers)} answer(s))")
+                self.trace_depth -= 1
+                for answer in answers:
+                    mark = len(trail)
+                    if hypothesis.unify(Fact._from_interned(hypothesis.predicate, hypothesis.pred_id, answer), bindings, trail):
+                        yield bindings
+                        bindings.undo(trail, mark)
+                return
+            
+            prune_count = self._prune_count
+            answers = []
+            
+            # Add to current goals (cycle detection)
+            self.current_goals.append(bound_hypothesis)
+            self.current_goals_set.add(bound_hypothesis)
+            
+            # Step 1: Check if the hypothesis matches any known facts
+            facts = self.kb.facts_for(bound_hypothesis)
+            if self.kb.has_only_ground_facts(bound_hypothesis):
+                # The goal's variables are unbound roots here, so matching a ground
+                # fact only has to compare constants and bind those variables
+                matches = _match_ground_rows(bound_hypothesis, facts)
+            else:
+                matches = ((fact, None) for fact in facts)
+            for fact, new_bindings in matches:
+                mark = len(trail)
+                if new_bindings is not None:
+                    for var, value in new_bindings:
+                        bindings.bind(var, value, trail)
+                    matched_hypothesis = fact
+                elif hypothesis.unify(fact, bindings, trail):
+                    matched_hypothesis = hypothesis.substitute(bindings, trail)
                 else:
-                    self._trace_print(f"✗ Rule failed: {rule}")
-        
-        if not results:
-            self._trace_print(f"✗ Cannot prove: {bound_hypothesis}")
-        
-        # Remove from current goals
-        self.current_goals.pop()
-        
-        self.trace_depth -= 1
-        return results
+                    continue
+                if self.trace:
+                    self._trace_print(f"✓ Matched fact: {fact}")
+                self.proved_goals.add(matched_hypothesis)
+                answers.append(matched_hypothesis.args)
+                self._suspend_goal()
+                yield bindings
+                self._resume_goal(bound_hypothesis)
+                bindings.undo(trail, mark)
+            
+            # Step 2: Try to prove using rules (backward chain through rules)
+            for rule in self.kb.rules_for(bound_hypothesis):
+                # Try to match the hypothesis with the rule's conclusion
+                mark = len(trail)
+                premises = self._resolve_head(rule._compiled, bound_hypothesis, bindings, trail)
+                if premises is not None:
+                    if self.trace:
+                        self._trace_print(f"Trying rule: {rule}")
+                    matched_hypothesis = hypothesis.substitute(bindings, trail)
+                    
+                    # Prove all premises of the rule, one solution at a time
+                    succeeded = False
+                    solutions = self._prove_premises(premises, bindings, trail)
+                    try:
+                        for _ in solutions:
+                            if not succeeded:
+                                succeeded = True
+                                if self.trace:
+                                    self._trace_print(f"✓ Rule succeeded: {rule}")
+                                # A head left with variables (they alias the goal's) only
+                                # proves some instance, so it cannot stand in for the goal
+                                if matched_hypothesis._is_ground:
+                                    self.proved_goals.add(matched_hypothesis)
+                            answers.append(hypothesis.substitute(bindings, trail).args)
+                            self._suspend_goal()
+                            yield bindings
+                            self._resume_goal(bound_hypothesis)
+                    finally:
+                        solutions.close()
+                    
+                    if not succeeded and self.trace:
+                        self._trace_print(f"✗ Rule failed: {rule}")
+                # Also after a failed head match, which may have bound part of the goal
+                bindings.undo(trail, mark)
+            
+            if not answers and self.trace:
+                self._trace_print(f"✗ Cannot prove: {bound_hypothesis}")
+            
+            # Table the answers if the goal ran to completion, nothing below it
+            # was cut off and all answers are ground
+            if self._prune_count == prune_count:
+                if not any(_is_variable(arg) for answer in answers for arg in answer):
+                    self._answer_table[table_key] = list(dict.fromkeys(answers))
+            
+            # Remove from current goals
+            self.current_goals_set.remove(self.current_goals.pop())
+            self.trace_depth -= 1
+        finally:
+            # Also runs when the caller stops early (close()): the goal is then
+            # suspended, so only the bindings need restoring
+            bindings.undo(trail, entry_mark)
+    
+    @staticmethod
+    def _export_bindings(bindings: Bindings) -> Bindings:
+        """Spell rule variables as ?_G<id> strings in bindings handed to callers."""
+        return Bindings((_term_str(var), _term_str(value)) for var, value in bindings.items())
     
-    def _prove_premises(self, premises: List[Fact], bindings: Dict[str, str]) -> List[Dict[str, str]]:
+    def _prove_premises(self, premises: List[Fact], bindings: Bindings, trail: Trail) -> Iterator[Bindings]:
         """
-        Try to prove all premises of a rule.
+        Lazily enumerate the solutions of all premises of a rule.
         
         Args:
             premises: List of premises to prove
-            bindings: Current variable bindings
+            bindings: Current variable bindings (extended in place per solution)
+            trail: Trail of the ongoing search
             
-        Returns:
-            List of binding dictionaries that prove all premises (empty if any premise fails)
+        Yields:
+            The live bindings once for every way of proving all premises
         """
         if not premises:
-            return [bindings]
+            yield bindings
+            return
         
-        # Try to prove the first premise
-        first_premise = premises[0]
-        remaining_premises = premises[1:]
-        
-        first_results = self.backchain_to_goal(first_premise, bindings)
-        
-        if not first_results:
-            return []
-        
-        # For each solution to the first premise, try to prove the remaining premises
-        all_results = []
-        for result_bindings in first_results:
-            if remaining_premises:
-                remaining_results = self._prove_premises(remaining_premises, result_bindings)
-                all_results.extend(remaining_results)
-            else:
-                all_results.append(result_bindings)
-        
-        return all_results
+        # Explicit goal stack instead of one recursive call per premise: entry i
+        # iterates the solutions of premises[i] under a solution of premises[:i]
+        stack = [self._solve(premises[0], bindings, trail)]
+        try:
+            while stack:
+                if next(stack[-1], None) is None:
+                    # No more alternatives for this premise: backtrack to the previous one
+                    stack.pop()
+                elif len(stack) == len(premises):
+                    yield bindings
+                else:
+                    stack.append(self._solve(premises[len(stack)], bindings, trail))
+        finally:
+            # Innermost first, so each generator restores the bindings it made
+            for solutions in reversed(stack):
+                solutions.close()
     
     def prove(self, hypothesis: Fact) -> bool:
         """
@@ -317,9 +961,18 @@ class BackwardChainer:
         Returns:
             True if provable, False otherwise
         """
+        # A materialized knowledge base holds every provable ground fact
+        if self.kb.materialized is not None and not self.trace and hypothesis._is_ground:
+            return hypothesis in self.kb.materialized
+        
         self.proved_goals.clear()
-        results = self.backchain_to_goal(hypothesis)
-        return len(results) > 0
+        self._answer_table.clear()
+        # One solution suffices: stop the search at the first one
+        solutions = self._solve(hypothesis, Bindings(), [])
+        try:
+            return next(solutions, None) is not None
+        finally:
+            solutions.close()
     
     def prove_with_bindings(self, hypothesis: Fact) -> List[Dict[str, str]]:
         """
@@ -329,10 +982,22 @@ class BackwardChainer:
             hypothesis: The hypothesis to prove
             
         Returns:
-            List of binding dictionaries
+            List of binding dictionaries, one per distinct answer for the query variables
         """
         self.proved_goals.clear()
-        return self.backchain_to_goal(hypothesis)
+        self._answer_table.clear()
+        query_vars = [arg for arg, is_var in zip(hypothesis.args, hypothesis._is_var) if is_var]
+        trail: Trail = []
+        
+        # Different proofs often reach the same answer; keep only the first
+        results = []
+        seen_answers: Set[frozenset] = set()
+        for solution in self._solve(hypothesis, Bindings(), trail):
+            answer = frozenset([(var, solution.find(var, trail)) for var in query_vars])
+            if answer not in seen_answers:
+                seen_answers.add(answer)
+                results.append(self._export_bindings(solution))
+        return results
 
 
 def create_animal_knowledge_base() -> KnowledgeBase:
@@ -437,24 +1102,19 @@ def extract_query_bindings(fact: Fact, bindings_list: List[Dict[str, str]]) -> L
     filtering out internal renamed variables and resolving chains.
     """
     # Find variables in the original query
-    query_vars = set(arg for arg in fact.args if arg.startswith('?'))
+    query_vars = set(arg for arg in fact.args if _is_variable(arg))
     
     result = []
     for bindings in bindings_list:
+        if not isinstance(bindings, Bindings):
+            bindings = Bindings(bindings)
         # Resolve binding chains and filter to query variables only
         clean_bindings = {}
         for var in query_vars:
             if var in bindings:
-                # Follow the chain of bindings to get the final value
-                value = bindings[var]
-                seen = {var}
-                while value in bindings and value.startswith('?'):
-                    if value in seen:
-                        break  # Avoid cycles
-                    seen.add(value)
-                    value = bindings[value]
+                value = bindings.find(var)
                 # Only keep if we found a concrete value (not a variable)
-                if not value.startswith('?'):
+                if not _is_variable(value):
                     clean_bindings[var] = value
         
         # Only include if we found actual bindings
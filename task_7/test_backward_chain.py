@@ -0,0 +1,226 @@
+"""
+Tests for the backward chaining engine.
+
+Run with pytest.
+"""
+
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backward_chain import Fact, Rule, KnowledgeBase, BackwardChainer, extract_query_bindings
+
+
+def answers(kb: KnowledgeBase, query: Fact):
+    """Distinct bindings of the query's variables, as a sorted list of item tuples."""
+    bindings = extract_query_bindings(query, BackwardChainer(kb).prove_with_bindings(query))
+    return sorted({tuple(sorted(b.items())) for b in bindings})
+
+
+class BaselineChainer:
+    """
+    The engine as it was before tabling: plain SLD resolution with a goal
+    stack for cycle detection, a depth limit, and a per-query cache of goals
+    already proved. Kept here as the reference the new engine must agree with.
+    """
+    
+    def __init__(self, kb: KnowledgeBase, max_depth: int = 50):
+        self.kb = kb
+        self.max_depth = max_depth
+        self.depth = 0
+        self.rule_counter = 0
+        self.proved_goals = set()
+        self.current_goals = []
+    
+    @staticmethod
+    def _resolve(term, bindings):
+        while term.startswith('?') and term in bindings:
+            term = bindings[term]
+        return term
+    
+    def _substitute(self, goal, bindings):
+        return Fact(goal.predicate, *(self._resolve(arg, bindings) for arg in goal.args))
+    
+    def _match(self, goal, other, bindings):
+        if goal.predicate != other.predicate or len(goal.args) != len(other.args):
+            return None
+        bindings = dict(bindings)
+        for x, y in zip(goal.args, other.args):
+            x, y = self._resolve(x, bindings), self._resolve(y, bindings)
+            if x.startswith('?'):
+                if x != y:
+                    bindings[x] = y
+            elif y.startswith('?'):
+                bindings[y] = x
+            elif x != y:
+                return None
+        return bindings
+    
+    def _rename(self, rule):
+        self.rule_counter += 1
+        rename = lambda fact: Fact(fact.predicate, *(
+            f"{arg}_{self.rule_counter}" if arg.startswith('?') else arg for arg in fact.args))
+        return rename(rule.conclusion), [rename(premise) for premise in rule.premises]
+    
+    def _solve(self, goal, bindings):
+        self.depth += 1
+        bound_goal = self._substitute(goal, bindings)
+        if self.depth > self.max_depth or bound_goal in self.current_goals:
+            self.depth -= 1
+            return []
+        if bound_goal in self.proved_goals:
+            self.depth -= 1
+            return [bindings]
+        self.current_goals.append(bound_goal)
+        
+        results = []
+        for fact in self.kb.facts:
+            matched = self._match(goal, fact, bindings)
+            if matched is not None:
+                self.proved_goals.add(self._substitute(goal, matched))
+                results.append(matched)
+        for rule in self.kb.rules:
+            conclusion, premises = self._rename(rule)
+            matched = self._match(goal, conclusion, bindings)
+            if matched is not None:
+                premise_results = self._solve_all(premises, matched)
+                if premise_results:
+                    self.proved_goals.add(self._substitute(goal, matched))
+                    results.extend(premise_results)
+        
+        self.current_goals.pop()
+        self.depth -= 1
+        return results
+    
+    def _solve_all(self, premises, bindings):
+        if not premises:
+            return [bindings]
+        return [result for first in self._solve(premises[0], bindings)
+                for result in self._solve_all(premises[1:], first)]
+    
+    def prove_with_bindings(self, goal):
+        self.proved_goals.clear()
+        return self._solve(goal, {})
+
+
+def baseline_answers(kb: KnowledgeBase, query: Fact):
+    """Same as answers(), computed by the baseline engine."""
+    bindings = extract_query_bindings(query, BaselineChainer(kb).prove_with_bindings(query))
+    return sorted({tuple(sorted(b.items())) for b in bindings})
+
+
+def naive_fixpoint(kb: KnowledgeBase):
+    """The least model by brute force: fire every rule on every fact until nothing changes."""
+    model = set(kb.facts)
+    while True:
+        derived = set()
+        for rule in kb.rules:
+            def extend(premises, binding):
+                if not premises:
+                    yield binding
+                    return
+                for fact in model:
+                    matched = premises[0].match(fact, binding)
+                    if matched is not None:
+                        yield from extend(premises[1:], matched)
+            for binding in extend(rule.premises, {}):
+                derived.add(Fact(rule.conclusion.predicate, *(binding.get(arg, arg) for arg in rule.conclusion.args)))
+        if derived <= model:
+            return model
+        model |= derived
+
+
+CONSTANTS = ["a", "b", "c"]
+VARIABLES = ["?X", "?Y", "?Z"]
+
+
+def random_kb(rng: random.Random, recursive: bool) -> KnowledgeBase:
+    """
+    A small KB over base predicates e/2 and f/1 and derived predicates
+    p/2, q/2 and s/1. Rule heads reuse body variables, sometimes twice
+    (p(?X, ?X)), and sometimes hold a constant (p(a, ?Y)).
+    
+    Without recursion each derived predicate only depends on the ones before
+    it, which keeps plain SLD resolution (the baseline) fast and complete.
+    """
+    kb = KnowledgeBase()
+    for _ in range(rng.randint(3, 8)):
+        if rng.random() < 0.7:
+            kb.add_fact(Fact("e", rng.choice(CONSTANTS), rng.choice(CONSTANTS)))
+        else:
+            kb.add_fact(Fact("f", rng.choice(CONSTANTS)))
+    
+    derived = [("p", 2), ("q", 2), ("s", 1)]
+    for level, (predicate, arity) in enumerate(derived):
+        body_predicates = [("e", 2), ("f", 1)] + derived[:len(derived) if recursive else level]
+        for _ in range(rng.randint(1, 2)):
+            premises = []
+            for _ in range(rng.randint(1, 2)):
+                body_predicate, body_arity = rng.choice(body_predicates)
+                premises.append(Fact(body_predicate, *(
+                    rng.choice(VARIABLES + CONSTANTS[:1]) for _ in range(body_arity))))
+            body_vars = [arg for premise in premises for arg in premise.args if arg.startswith('?')]
+            head = [rng.choice(body_vars) if body_vars and rng.random() < 0.8 else rng.choice(CONSTANTS)
+                    for _ in range(arity)]
+            kb.add_rule(Rule(Fact(predicate, *head), premises))
+    return kb
+
+
+def all_queries():
+    """Every query over the KB's predicates mixing constants, distinct and repeated variables."""
+    for predicate, arity in [("e", 2), ("f", 1), ("p", 2), ("q", 2), ("s", 1)]:
+        for args in itertools.product(["?A", "?B", "a", "b"], repeat=arity):
+            yield Fact(predicate, *args)
+
+
+def test_failed_head_match_does_not_leak_bindings():
+    """A rule head that binds part of the goal and then fails must not affect later rules."""
+    kb = KnowledgeBase()
+    kb.add_fact(Fact("r", "d"))
+    # s(a, a) binds ?B to a, then fails on d; s(?Y, ?Y) must still see ?B unbound
+    kb.add_rule(Rule(Fact("s", "a", "a"), [Fact("q", "a", "a")]))
+    kb.add_rule(Rule(Fact("s", "?Y", "?Y"), [Fact("r", "?Y")]))
+
+    query = Fact("s", "?B", "d")
+    assert answers(kb, query) == [(("?B", "d"),)]
+    assert BackwardChainer(kb).prove(query)
+
+
+def test_answers_match_baseline_engine():
+    """prove_with_bindings gives the same answer sets as the pre-tabling engine."""
+    rng = random.Random(7)
+    for _ in range(150):
+        kb = random_kb(rng, recursive=False)
+        for query in all_queries():
+            expected = baseline_answers(kb, query)
+            assert answers(kb, query) == expected, f"{query} on\n{kb}"
+            assert BackwardChainer(kb).prove(query) == bool(BaselineChainer(kb).prove_with_bindings(query)), \
+                f"{query} on\n{kb}"
+
+
+def test_materialize_matches_naive_fixpoint():
+    """Semi-naive materialize() derives exactly the naive least model, recursive rules included."""
+    rng = random.Random(11)
+    for _ in range(150):
+        kb = random_kb(rng, recursive=True)
+        assert kb.materialize() == naive_fixpoint(kb), str(kb)
+
+
+def test_left_recursion_terminates():
+    """Tabling answers a left-recursive transitive closure, cycle included, instead of looping."""
+    kb = KnowledgeBase()
+    for x, y in [("a", "b"), ("b", "c"), ("c", "a"), ("d", "a")]:
+        kb.add_fact(Fact("edge", x, y))
+    kb.add_rule(Rule(Fact("path", "?X", "?Y"), [Fact("path", "?X", "?Z"), Fact("edge", "?Z", "?Y")]))
+    kb.add_rule(Rule(Fact("path", "?X", "?Y"), [Fact("edge", "?X", "?Y")]))
+    
+    assert answers(kb, Fact("path", "a", "?Y")) == [(("?Y", y),) for y in "abc"]
+    assert answers(kb, Fact("path", "?X", "?X")) == [(("?X", x),) for x in "abc"]
+    assert not BackwardChainer(kb).prove(Fact("path", "a", "d"))
+    
+    paths = {fact for fact in kb.materialize() if fact.predicate == "path"}
+    assert answers(kb, Fact("path", "?X", "?Y")) == sorted(
+        (("?X", fact.args[0]), ("?Y", fact.args[1])) for fact in paths)
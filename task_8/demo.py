@@ -38,7 +38,7 @@ env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
 from langchain_reasoner import LangChainReasoner
-from kb_to_chromadb import ingest_kb_to_chromadb
+from kb_to_chromadb import ingest_kb_to_chromadb, query_kb_batch
 
 
 def setup_kb():
@@ -89,6 +89,16 @@ def main():
     # The main query the user wants to test
     question = "Is Benson in charge of Mordecai?"
     
+    additional_questions = [
+        "Are Mordecai and Rigby friends?",
+        "Is Mordecai a park worker?",
+        "Does Benson have authority?",
+    ]
+    
+    # Retrieve context for every demo question in one batched ChromaDB query;
+    # reason() then serves its RAG step from the query cache
+    query_kb_batch([question] + additional_questions, n_results=15)
+    
     print("\n" + "=" * 80)
     print("QUERY: " + question)
     print("=" * 80)
@@ -120,12 +130,6 @@ def main():
     print("ADDITIONAL TEST QUERIES")
     print("=" * 80)
     
-    additional_questions = [
-        "Are Mordecai and Rigby friends?",
-        "Is Mordecai a park worker?",
-        "Does Benson have authority?",
-    ]
-    
     for q in additional_questions:
         print(f"\n{'─' * 80}")
         print(f"Query: {q}")
@@ -13,7 +13,8 @@ Key Features:
 RAG Pipeline:
 1. Parse Prolog KB → Facts and Rules
 2. Generate natural language descriptions
-3. Store in ChromaDB (auto-embedding)
+3. Store in ChromaDB (auto-embedding), or with KB_BACKEND=sqlite-vec in a
+   sqlite-vec table (same embedding model)
 4. Query with natural language → Retrieve relevant entries
 
 Critical for:
@@ -22,17 +23,79 @@ Critical for:
 - Natural language querying
 """
 
+import asyncio
 import os
+import sqlite3
 import sys
-from typing import List, Dict
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+
+try:
+    import sqlite_vec
+except ImportError:  # Only needed with KB_BACKEND=sqlite-vec
+    sqlite_vec = None
 
 # Import prolog parser
-from prolog_parser import parse_prolog_file
+from prolog_parser import parse_prolog_file_cached
+
+# Documents per collection.add call; each call embeds its whole batch at once
+INGEST_BATCH_SIZE = 256
+
+# Vector store: "chroma" (ChromaDB, default) or "sqlite-vec" (a vec0 table in VEC_DB_PATH)
+KB_BACKEND = os.getenv("KB_BACKEND", "chroma")
+VEC_DB_PATH = os.path.join(os.path.dirname(__file__), "vec_kb.sqlite")
+
+# Optional ChromaDB server (e.g. `chroma run --path task_8/chroma_db`); unset means in-process storage
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+
+# ChromaDB clients and collections shared across calls (opening one reads sqlite and index metadata)
+_CLIENTS: Dict[str, "chromadb.ClientAPI"] = {}
+_COLLECTIONS: Dict[Tuple[str, str], chromadb.Collection] = {}
+_CLIENTS_LOCK = threading.RLock()
+# sqlite-vec connection (shared by all threads; queries hold _CLIENTS_LOCK)
+_VEC_CONNECTION: Optional[sqlite3.Connection] = None
+# Async server clients, one per event loop (their connections belong to the loop that opened them)
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+# query_kb result cache: LRU with a time-to-live, cleared whenever a KB is ingested
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 300.0  # seconds
+_query_cache: "OrderedDict[Tuple[int, str, str, int], Tuple[float, List[Dict]]]" = OrderedDict()
+_query_cache_lock = threading.RLock()
+_kb_version = 0  # Part of the cache key, so a query racing an ingestion can't cache stale results
 
+# Question embeddings, LRU; reused across n_results values and re-ingestion (the model doesn't change)
+EMBEDDING_CACHE_SIZE = 4096
+_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+_embedding_lock = threading.RLock()
+_embedding_function = None  # Same model Chroma embeds the documents with; loaded on first use
 
-def create_fact_document(fact: object) -> Dict[str, str]:
+# Natural language descriptions by predicate (other predicates use their Prolog form)
+_FACT_TEMPLATES: Dict[str, Callable[[Tuple[str, ...]], str]] = {
+    "park_worker": lambda args: f"{args[0]} is a park worker",
+    "boss": lambda args: f"{args[0]} is a boss",
+    "park_manager": lambda args: f"{args[0]} is a park manager",
+    "character_type": lambda args: f"{args[0]} is a {args[1]}",
+    "friends": lambda args: f"{args[0]} and {args[1]} are friends",
+    "reports_to": lambda args: f"{args[0]} reports to {args[1]}",
+}
+
+_RULE_DESCRIPTIONS: Dict[str, str] = {
+    "in_charge_of": "Someone is in charge of another person if that person reports to them",
+    "work_together": "Two people work together if they are both park workers and different people",
+    "has_authority": "Someone has authority if they are a boss or park manager",
+    "is_subordinate": "Someone is a subordinate if they report to someone",
+}
+
+
+def create_fact_document(fact: object) -> Tuple[str, str, str, str]:
     """
     Create a document for a fact with metadata.
     
@@ -40,7 +103,7 @@ def create_fact_document(fact: object) -> Dict[str, str]:
         fact: Fact object
         
     Returns:
-        Document dictionary
+        Document tuple (text, prolog, predicate, type)
     """
     fact_str = str(fact)
     
@@ -49,30 +112,13 @@ def create_fact_document(fact: object) -> Dict[str, str]:
     args = fact.args if hasattr(fact, 'args') else []
     
     # Generate human-readable description
-    if predicate == "park_worker":
-        description = f"{args[0]} is a park worker"
-    elif predicate == "boss":
-        description = f"{args[0]} is a boss"
-    elif predicate == "park_manager":
-        description = f"{args[0]} is a park manager"
-    elif predicate == "character_type":
-        description = f"{args[0]} is a {args[1]}"
-    elif predicate == "friends":
-        description = f"{args[0]} and {args[1]} are friends"
-    elif predicate == "reports_to":
-        description = f"{args[0]} reports to {args[1]}"
-    else:
-        description = fact_str
+    template = _FACT_TEMPLATES.get(predicate)
+    description = template(args) if template else fact_str
     
-    return {
-        "text": description,
-        "prolog": fact_str,
-        "predicate": predicate,
-        "type": "fact"
-    }
+    return description, fact_str, predicate, "fact"
 
 
-def create_rule_document(rule: object) -> Dict[str, str]:
+def create_rule_document(rule: object) -> Tuple[str, str, str, str]:
     """
     Create a document for a rule with metadata.
     
@@ -80,7 +126,7 @@ def create_rule_document(rule: object) -> Dict[str, str]:
         rule: Rule object
         
     Returns:
-        Document dictionary
+        Document tuple (text, prolog, predicate, type)
     """
     rule_str = str(rule)
     
@@ -89,45 +135,100 @@ def create_rule_document(rule: object) -> Dict[str, str]:
     predicate = conclusion.predicate
     
     # Generate human-readable description
-    if predicate == "in_charge_of":
-        description = "Someone is in charge of another person if that person reports to them"
-    elif predicate == "work_together":
-        description = "Two people work together if they are both park workers and different people"
-    elif predicate == "has_authority":
-        description = "Someone has authority if they are a boss or park manager"
-    elif predicate == "is_subordinate":
-        description = "Someone is a subordinate if they report to someone"
-    else:
-        description = f"Rule: {rule_str}"
+    description = _RULE_DESCRIPTIONS.get(predicate) or f"Rule: {rule_str}"
     
-    return {
-        "text": description,
-        "prolog": rule_str,
-        "predicate": predicate,
-        "type": "rule"
-    }
+    return description, rule_str, predicate, "rule"
+
 
+def _get_client(db_path: str) -> "chromadb.ClientAPI":
+    """Return the client for db_path (or the CHROMA_HOST server), opening it on first use."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(db_path)
+        if client is None:
+            if CHROMA_HOST:
+                client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+            else:
+                client = chromadb.PersistentClient(path=db_path)
+            _CLIENTS[db_path] = client
+        return client
 
-def ingest_kb_to_chromadb(kb_path: str, collection_name: str = "regular_show_kb") -> chromadb.Collection:
+
+async def _get_async_client():
+    """Return the CHROMA_HOST async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = _ASYNC_CLIENTS[loop] = await chromadb.AsyncHttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    return client
+
+
+def _get_collection(db_path: str, collection_name: str) -> chromadb.Collection:
+    """Return a collection handle, fetching it from the client on first use."""
+    with _CLIENTS_LOCK:
+        collection = _COLLECTIONS.get((db_path, collection_name))
+        if collection is None:
+            collection = _get_client(db_path).get_collection(collection_name)
+            _COLLECTIONS[(db_path, collection_name)] = collection
+        return collection
+
+
+def _get_vec_connection() -> sqlite3.Connection:
+    """Return the sqlite-vec connection to VEC_DB_PATH, opening it on first use."""
+    global _VEC_CONNECTION
+    with _CLIENTS_LOCK:
+        if _VEC_CONNECTION is None:
+            if sqlite_vec is None:
+                raise ImportError("KB_BACKEND=sqlite-vec requires the sqlite-vec package (pip install sqlite-vec)")
+            connection = sqlite3.connect(VEC_DB_PATH, check_same_thread=False)
+            connection.enable_load_extension(True)
+            sqlite_vec.load(connection)
+            connection.enable_load_extension(False)
+            _VEC_CONNECTION = connection
+        return _VEC_CONNECTION
+
+
+def ingest_kb_to_chromadb(kb_path: str, collection_name: str = "regular_show_kb"):
     """
-    Ingest Regular Show knowledge base into ChromaDB.
+    Ingest Regular Show knowledge base into ChromaDB (or sqlite-vec, see KB_BACKEND).
     
     Args:
         kb_path: Path to Prolog KB file
-        collection_name: Name of ChromaDB collection
+        collection_name: Name of ChromaDB collection (sqlite-vec table)
         
     Returns:
-        ChromaDB collection
+        ChromaDB collection, or the sqlite-vec connection
     """
     print(f"Parsing KB from {kb_path}...")
-    facts, rules = parse_prolog_file(kb_path)
+    facts, rules = parse_prolog_file_cached(kb_path)
     print(f"✓ Parsed {len(facts)} facts and {len(rules)} rules")
     
+    # Prepare documents (facts first, then rules)
+    docs = [*map(create_fact_document, facts), *map(create_rule_document, rules)]
+    
+    if KB_BACKEND == "sqlite-vec":
+        collection = _ingest_sqlite_vec(docs, collection_name)
+    else:
+        collection = _ingest_chromadb(docs, len(facts), collection_name)
+    
+    # Cached query results describe the old KB
+    global _kb_version
+    with _query_cache_lock:
+        _kb_version += 1
+        _query_cache.clear()
+    
+    return collection
+
+
+def _ingest_chromadb(docs: List[Tuple[str, str, str, str]], fact_count: int,
+                     collection_name: str) -> chromadb.Collection:
+    """Store documents (facts first, then rules) in a new ChromaDB collection."""
     # Initialize ChromaDB client (persistent)
     db_path = os.path.join(os.path.dirname(__file__), "chroma_db")
-    client = chromadb.PersistentClient(path=db_path)
+    client = _get_client(db_path)
     
     # Delete existing collection if it exists
+    with _CLIENTS_LOCK:
+        _COLLECTIONS.pop((db_path, collection_name), None)
     try:
         client.delete_collection(collection_name)
         print(f"✓ Deleted existing collection: {collection_name}")
@@ -139,51 +240,101 @@ def ingest_kb_to_chromadb(kb_path: str, collection_name: str = "regular_show_kb"
         name=collection_name,
         metadata={"description": "Regular Show Knowledge Base"}
     )
+    with _CLIENTS_LOCK:
+        _COLLECTIONS[(db_path, collection_name)] = collection
     print(f"✓ Created collection: {collection_name}")
     
-    # Prepare documents
-    documents = []
-    metadatas = []
-    ids = []
-    
-    # Add facts
-    for i, fact in enumerate(facts):
-        doc = create_fact_document(fact)
-        documents.append(doc["text"])
-        metadatas.append({
-            "prolog": doc["prolog"],
-            "predicate": doc["predicate"],
-            "type": doc["type"]
-        })
-        ids.append(f"fact_{i}")
-    
-    # Add rules
-    for i, rule in enumerate(rules):
-        doc = create_rule_document(rule)
-        documents.append(doc["text"])
-        metadatas.append({
-            "prolog": doc["prolog"],
-            "predicate": doc["predicate"],
-            "type": doc["type"]
-        })
-        ids.append(f"rule_{i}")
-    
-    # Add to collection
+    documents = [text for text, _, _, _ in docs]
+    metadatas = [
+        {"prolog": prolog, "predicate": predicate, "type": doc_type}
+        for _, prolog, predicate, doc_type in docs
+    ]
+    ids = [f"fact_{i}" for i in range(fact_count)] + [f"rule_{i}" for i in range(len(docs) - fact_count)]
+    
+    # Add to collection in batches so only one batch of embeddings is in memory at a time.
+    # Batches are cut from the documents sorted by length, so texts of similar length
+    # are embedded together and little is padded (retrieval doesn't depend on order)
     print(f"Ingesting {len(documents)} documents into ChromaDB...")
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
+    order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+    for start in range(0, len(order), INGEST_BATCH_SIZE):
+        batch = order[start:start + INGEST_BATCH_SIZE]
+        collection.add(
+            documents=[documents[i] for i in batch],
+            metadatas=[metadatas[i] for i in batch],
+            ids=[ids[i] for i in batch]
+        )
     print(f"✓ Ingested {len(documents)} documents")
     
     return collection
 
 
+def _ingest_sqlite_vec(docs: List[Tuple[str, str, str, str]], collection_name: str) -> sqlite3.Connection:
+    """Embed documents and store them in a new sqlite-vec table named collection_name."""
+    global _embedding_function
+    with _embedding_lock:
+        if _embedding_function is None:
+            _embedding_function = DefaultEmbeddingFunction()
+        embedding_function = _embedding_function
+    
+    # Embed in length-sorted batches like the ChromaDB path (the same model, so
+    # query embeddings from _embed_queries match)
+    print(f"Ingesting {len(docs)} documents into sqlite-vec...")
+    order = sorted(range(len(docs)), key=lambda i: len(docs[i][0]))
+    rows = []
+    dimensions = 384  # all-MiniLM-L6-v2; taken from the embeddings when there are any
+    for start in range(0, len(order), INGEST_BATCH_SIZE):
+        batch = [docs[i] for i in order[start:start + INGEST_BATCH_SIZE]]
+        embeddings = embedding_function([text for text, _, _, _ in batch])
+        dimensions = len(embeddings[0])
+        rows.extend(
+            (sqlite_vec.serialize_float32(list(embedding)), text, prolog, predicate, doc_type)
+            for embedding, (text, prolog, predicate, doc_type) in zip(embeddings, batch)
+        )
+    
+    connection = _get_vec_connection()
+    with _CLIENTS_LOCK, connection:
+        connection.execute(f'DROP TABLE IF EXISTS "{collection_name}"')
+        # L2 distance, as in ChromaDB's default space; '+' columns are stored, not indexed
+        connection.execute(
+            f'CREATE VIRTUAL TABLE "{collection_name}" USING vec0('
+            f'embedding float[{dimensions}], type text, '
+            f'+text text, +prolog text, +predicate text)'
+        )
+        connection.executemany(
+            f'INSERT INTO "{collection_name}"(embedding, text, prolog, predicate, type) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+    print(f"✓ Ingested {len(docs)} documents")
+    
+    return connection
+
+
+def _cache_get(key: Tuple[int, str, str, int]):
+    """Return cached documents for key, or None if absent or expired."""
+    with _query_cache_lock:
+        entry = _query_cache.get(key)
+        if entry is None or time.monotonic() - entry[0] >= QUERY_CACHE_TTL:
+            return None
+        _query_cache.move_to_end(key)
+        return entry[1]
+
+
+def _cache_put(key: Tuple[int, str, str, int], documents: List[Dict]):
+    """Store documents for key, evicting the least recently used entries."""
+    with _query_cache_lock:
+        _query_cache[key] = (time.monotonic(), documents)
+        _query_cache.move_to_end(key)
+        while len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+
+
 def query_kb(query: str, collection_name: str = "regular_show_kb", n_results: int = 10) -> List[Dict]:
     """
     Query the knowledge base from ChromaDB.
     
+    Results are cached (LRU, QUERY_CACHE_TTL seconds) per collection, query and
+    n_results, so repeated questions skip embedding and search.
+    
     Args:
         query: Natural language query
         collection_name: Name of ChromaDB collection
@@ -192,31 +343,185 @@ def query_kb(query: str, collection_name: str = "regular_show_kb", n_results: in
     Returns:
         List of relevant documents
     """
+    return query_kb_batch([query], collection_name, n_results)[0]
+
+
+def query_kb_batch(queries: List[str], collection_name: str = "regular_show_kb",
+                   n_results: int = 10) -> List[List[Dict]]:
+    """
+    Query the knowledge base for several questions with a single ChromaDB call.
+    
+    The uncached queries are embedded as one batch; their results go into the
+    query_kb cache, so later query_kb calls for the same questions are free.
+    
+    Args:
+        queries: Natural language queries
+        collection_name: Name of ChromaDB collection
+        n_results: Number of results to return per query
+        
+    Returns:
+        List of relevant documents for each query, in order
+    """
+    version = _kb_version
+    results: List[Optional[List[Dict]]] = [
+        _cache_get((version, collection_name, query, n_results)) for query in queries
+    ]
+    
+    missing = list(dict.fromkeys(query for query, docs in zip(queries, results) if docs is None))
+    if missing:
+        fetched = dict(zip(missing, search_collection(missing, collection_name, n_results)))
+        for query, documents in fetched.items():
+            _cache_put((version, collection_name, query, n_results), documents)
+        results = [docs if docs is not None else fetched[query] for query, docs in zip(queries, results)]
+    
+    # Copies, so callers can't modify the cached documents
+    return [[dict(doc) for doc in docs] for docs in results]
+
+
+def _embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embed queries, running the model only on those not embedded before (in one batch)."""
+    global _embedding_function
+    with _embedding_lock:
+        missing = [query for query in dict.fromkeys(queries) if query not in _embedding_cache]
+        if missing:
+            if _embedding_function is None:
+                _embedding_function = DefaultEmbeddingFunction()
+            for query, embedding in zip(missing, _embedding_function(missing)):
+                _embedding_cache[query] = embedding
+        embeddings = []
+        for query in queries:
+            _embedding_cache.move_to_end(query)
+            embeddings.append(_embedding_cache[query])
+        while len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+        return embeddings
+
+
+def warm_up(collection_name: str = "regular_show_kb"):
+    """
+    Load the embedding model and open the collection ahead of the first query.
+    
+    Both happen lazily on first use and take about a second; calling this from a
+    background thread moves that off the first question's critical path. A query
+    that arrives mid-warm-up waits for the model rather than loading it again.
+    """
+    global _embedding_function
+    with _embedding_lock:
+        if _embedding_function is None:
+            _embedding_function = DefaultEmbeddingFunction()
+            _embedding_function(["warm up"])  # First call initializes the ONNX session
+    if KB_BACKEND == "sqlite-vec":
+        _get_vec_connection()
+        return
+    db_path = os.path.join(os.path.dirname(__file__), "chroma_db")
+    _get_collection(db_path, collection_name)
+
+
+async def aquery_kb(query: str, collection_name: str = "regular_show_kb", n_results: int = 10) -> List[Dict]:
+    """
+    Async version of query_kb (same cache).
+    
+    With a ChromaDB server (CHROMA_HOST) the search goes through AsyncHttpClient
+    and doesn't block the event loop; otherwise the in-process query runs in a
+    worker thread.
+    
+    Args:
+        query: Natural language query
+        collection_name: Name of ChromaDB collection
+        n_results: Number of results to return
+        
+    Returns:
+        List of relevant documents
+    """
+    if not CHROMA_HOST or KB_BACKEND == "sqlite-vec":
+        return await asyncio.to_thread(query_kb, query, collection_name, n_results)
+    
+    key = (_kb_version, collection_name, query, n_results)
+    documents = _cache_get(key)
+    if documents is None:
+        client = await _get_async_client()
+        collection = await client.get_collection(collection_name)
+        embeddings = await asyncio.to_thread(_embed_queries, [query])
+        results = await collection.query(
+            query_embeddings=embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas"]
+        )
+        documents = _to_documents(results)[0]
+        _cache_put(key, documents)
+    
+    return [dict(doc) for doc in documents]
+
+
+def kb_version() -> int:
+    """Number of ingestions so far in this process; changes whenever the KB is re-ingested."""
+    return _kb_version
+
+
+def search_collection(queries: List[str], collection_name: str = "regular_show_kb",
+                      n_results: int = 10) -> List[List[Dict]]:
+    """
+    Run queries against the ChromaDB collection (or sqlite-vec table) in one call.
+    
+    Unlike query_kb_batch this bypasses the query cache, for callers that cache
+    results themselves (keyed on kb_version()).
+    """
+    if KB_BACKEND == "sqlite-vec":
+        return _search_sqlite_vec(queries, collection_name, n_results)
+    
     db_path = os.path.join(os.path.dirname(__file__), "chroma_db")
-    client = chromadb.PersistentClient(path=db_path)
-    collection = client.get_collection(collection_name)
+    collection = _get_collection(db_path, collection_name)
     
+    # Pass our own (cached) embeddings so Chroma doesn't re-embed recurring questions.
+    # Distances are never used, so don't ask Chroma to return them
     results = collection.query(
-        query_texts=[query],
-        n_results=n_results
+        query_embeddings=_embed_queries(queries),
+        n_results=n_results,
+        include=["documents", "metadatas"]
     )
     
-    documents = []
-    for i in range(len(results['documents'][0])):
-        documents.append({
-            "text": results['documents'][0][i],
-            "prolog": results['metadatas'][0][i]['prolog'],
-            "predicate": results['metadatas'][0][i]['predicate'],
-            "type": results['metadatas'][0][i]['type']
-        })
-    
-    return documents
+    return _to_documents(results)
+
+
+def _search_sqlite_vec(queries: List[str], collection_name: str, n_results: int) -> List[List[Dict]]:
+    """Run queries as sqlite-vec KNN searches (uncached); the distance scan runs in C."""
+    connection = _get_vec_connection()
+    embeddings = _embed_queries(queries)
+    # 'k = ?' rather than LIMIT: KNN LIMIT needs SQLite 3.41+
+    sql = (
+        f'SELECT text, prolog, predicate, type FROM "{collection_name}" '
+        f'WHERE embedding MATCH ? AND k = ? ORDER BY distance'
+    )
+    with _CLIENTS_LOCK:
+        return [
+            [
+                {"text": text, "prolog": prolog, "predicate": predicate, "type": doc_type}
+                for text, prolog, predicate, doc_type in connection.execute(
+                    sql, (sqlite_vec.serialize_float32(list(embedding)), n_results)
+                )
+            ]
+            for embedding in embeddings
+        ]
+
+
+def _to_documents(results: Dict) -> List[List[Dict]]:
+    """Convert a ChromaDB query result into per-query document lists."""
+    return [
+        [
+            {
+                "text": text,
+                "prolog": metadata['prolog'],
+                "predicate": metadata['predicate'],
+                "type": metadata['type']
+            }
+            for text, metadata in zip(texts, metadatas)
+        ]
+        for texts, metadatas in zip(results['documents'], results['metadatas'])
+    ]
 
 
 if __name__ == "__main__":
     # Ingest the Regular Show KB
-    import sys
-    
     kb_path = "../task_4/regular_show_kb.pl"
     if len(sys.argv) > 1:
         kb_path = sys.argv[1]
@@ -26,6 +26,9 @@ Critical for:
 
 import os
 import sys
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
@@ -35,17 +38,46 @@ from langchain.prompts import ChatPromptTemplate
 from langchain.schema.runnable import RunnableSequence
 
 # Import our components
-from kb_to_chromadb import query_kb
-from prolog_parser import parse_prolog_line
+from kb_to_chromadb import aquery_kb, warm_up
+from prolog_parser import parse_prolog_fact, parse_prolog_line_cached
 
 # Import backward chainer from task_7
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'task_7'))
+_TASK_7_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_7')
+if _TASK_7_DIR not in sys.path:
+    sys.path.append(_TASK_7_DIR)
 from backward_chain import Fact, Rule, KnowledgeBase, BackwardChainer
 
 # Load environment variables
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
+# Embedding model / collection warm-up, run once per process in the background
+# and shared by every LangChainReasoner
+_WARM_UP_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-warm-up")
+_warm_up_future: Optional[Future] = None
+_warm_up_lock = threading.Lock()
+
+
+def _start_warm_up() -> Future:
+    """Submit warm_up on first use; later calls share the same future."""
+    global _warm_up_future
+    with _warm_up_lock:
+        if _warm_up_future is None:
+            _warm_up_future = _WARM_UP_EXECUTOR.submit(warm_up)
+        return _warm_up_future
+
+
+def _report_warm_up_failure():
+    """Print why a finished warm-up failed, once, and let the next reasoner retry it."""
+    global _warm_up_future
+    with _warm_up_lock:
+        future = _warm_up_future
+        if future is None or not future.done() or future.exception() is None:
+            return
+        _warm_up_future = None
+    error = future.exception()
+    print(f"⚠ KB warm-up failed: {type(error).__name__}: {error}")
+
 
 class LangChainReasoner:
     """
@@ -65,6 +97,10 @@ class LangChainReasoner:
         """
         self.llm = ChatOpenAI(model=model, temperature=temperature)
         self._build_chains()
+        
+        # Load the embedding model and ChromaDB collection in the background so the
+        # first reason() call doesn't pay for it; a failure is reported by areason()
+        _start_warm_up()
     
     def _build_chains(self):
         """Build LangChain processing chains."""
@@ -139,23 +175,33 @@ Provide a natural language explanation of the result and reasoning.""")
         """
         try:
             response = self.parse_chain.invoke({"question": question})
-            prolog_query = response.content.strip()
-            
-            # Remove any markdown formatting
-            prolog_query = prolog_query.replace("```", "").strip()
-            
-            print(f"  Parsed query: {prolog_query}")
-            
-            # Parse the Prolog query to a Fact
-            from prolog_parser import parse_prolog_fact
-            fact = parse_prolog_fact(prolog_query)
-            
-            return fact
-            
+            return self._response_to_fact(response.content)
+        except Exception as e:
+            print(f"  Error parsing question: {e}")
+            return None
+    
+    async def aparse_question_to_fact(self, question: str) -> Optional[Fact]:
+        """Async version of parse_question_to_fact (awaits the LLM call)."""
+        try:
+            response = await self.parse_chain.ainvoke({"question": question})
+            return self._response_to_fact(response.content)
         except Exception as e:
             print(f"  Error parsing question: {e}")
             return None
     
+    @staticmethod
+    def _response_to_fact(content: str) -> Optional[Fact]:
+        """Turn the LLM's Prolog query into a Fact."""
+        prolog_query = content.strip()
+        
+        # Remove any markdown formatting
+        prolog_query = prolog_query.replace("```", "").strip()
+        
+        print(f"  Parsed query: {prolog_query}")
+        
+        # Parse the Prolog query to a Fact
+        return parse_prolog_fact(prolog_query)
+    
     def build_kb_from_retrieved(self, retrieved_docs: List[Dict]) -> KnowledgeBase:
         """
         Build a KnowledgeBase from retrieved documents.
@@ -167,12 +213,16 @@ Provide a natural language explanation of the result and reasoning.""")
             KnowledgeBase object
         """
         kb = KnowledgeBase()
+        seen = set()
         
         for doc in retrieved_docs:
             prolog_str = doc['prolog']
-            doc_type = doc['type']
+            # The same entry can be retrieved more than once; add it only once
+            if prolog_str in seen:
+                continue
+            seen.add(prolog_str)
             
-            result = parse_prolog_line(prolog_str)
+            result = parse_prolog_line_cached(prolog_str)
             if result:
                 kind, obj = result
                 if kind == "fact":
@@ -186,6 +236,10 @@ Provide a natural language explanation of the result and reasoning.""")
         """
         Main reasoning pipeline using LangChain and backward chaining.
         
+        Async callers (Jupyter, FastAPI, ...) should await areason() instead:
+        called from a running event loop, this runs areason() on its own loop
+        in a worker thread and blocks the caller's loop until it finishes.
+        
         Args:
             question: Natural language question
             verbose: Whether to print intermediate steps
@@ -193,28 +247,41 @@ Provide a natural language explanation of the result and reasoning.""")
         Returns:
             Dictionary with result and trace
         """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.areason(question, verbose=verbose))
+        # asyncio.run can't nest inside a running loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.areason(question, verbose=verbose)).result()
+    
+    async def areason(self, question: str, verbose: bool = True) -> Dict:
+        """
+        Async reasoning pipeline: RAG retrieval and question parsing don't depend
+        on each other, so they run concurrently. See reason() for arguments.
+        """
         if verbose:
             print("\n" + "=" * 80)
             print(f"Question: {question}")
             print("=" * 80)
         
-        # Step 1: RAG - Retrieve relevant KB entries
+        _report_warm_up_failure()
+        
+        # Step 1: RAG - Retrieve relevant KB entries, and
+        # Step 2: LangChain - Parse question to Fact (concurrently)
         if verbose:
-            print("\n[Step 1: RAG Retrieval]")
+            print("\n[Step 1: RAG Retrieval + Step 2: Parse Question with LangChain]")
         
-        retrieved_docs = query_kb(question, n_results=15)
+        retrieved_docs, fact = await asyncio.gather(
+            aquery_kb(question, n_results=15),
+            self.aparse_question_to_fact(question),
+        )
         
         if verbose:
             print(f"  Retrieved {len(retrieved_docs)} relevant KB entries")
             print(f"  - Facts: {sum(1 for d in retrieved_docs if d['type'] == 'fact')}")
             print(f"  - Rules: {sum(1 for d in retrieved_docs if d['type'] == 'rule')}")
         
-        # Step 2: LangChain - Parse question to Fact
-        if verbose:
-            print("\n[Step 2: Parse Question with LangChain]")
-        
-        fact = self.parse_question_to_fact(question)
-        
         if not fact:
             return {
                 "question": question,
@@ -238,17 +305,12 @@ Provide a natural language explanation of the result and reasoning.""")
         if verbose:
             print("\n[Step 4: Backward Chaining Inference]")
         
-        chainer = BackwardChainer(kb, trace=verbose, max_depth=50)
-        
-        # Capture the trace output
-        import io
-        from contextlib import redirect_stdout
+        # Collect the trace lines directly instead of capturing stdout
+        trace_lines: List[str] = []
+        chainer = BackwardChainer(kb, trace=verbose, max_depth=50, trace_sink=trace_lines)
+        result = chainer.prove(fact)
         
-        trace_buffer = io.StringIO()
-        with redirect_stdout(trace_buffer):
-            result = chainer.prove(fact)
-        
-        trace = trace_buffer.getvalue()
+        trace = "\n".join(trace_lines)
         
         # Step 5: Format result
         if verbose:
@@ -293,8 +355,6 @@ Provide a natural language explanation of the result and reasoning.""")
 
 if __name__ == "__main__":
     # Example usage
-    import sys
-    
     if not os.getenv("OPENAI_API_KEY"):
         print("Error: OPENAI_API_KEY not set")
         print("Set it in your environment or .env file")
@@ -21,12 +21,33 @@ Critical for:
 import re
 import sys
 import os
-from typing import List, Tuple, Optional
+import pickle
+from functools import lru_cache
+from typing import Iterator, List, Tuple, Optional
 
 # Import from task_7
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'task_7'))
+_TASK_7_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_7')
+if _TASK_7_DIR not in sys.path:
+    sys.path.append(_TASK_7_DIR)
 from backward_chain import Fact, Rule
 
+# Compiled once at import: predicate(args)
+_FACT_RE = re.compile(r'(\w+)\((.*?)\)')
+# Prolog "not equal" operator; premises using it are skipped
+_NOT_EQUAL = '\\='
+# Characters split_premises has to look at; everything between them is skipped in C
+_DELIMITER_RE = re.compile(r'[(),]')
+# Tokens that delimit statements: a quoted atom, string or 0'c character code
+# (group 1, kept verbatim so a '%' or '. ' inside it means nothing), a comment
+# or line break (replaced by a space so statements can span lines), or the end
+# token: a '.' followed by whitespace or end of file
+_STATEMENT_TOKEN_RE = re.compile(
+    r"""(0'(?:\\.|.)|'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|%[^\n]*|\n|\.(?=\s|$)"""
+)
+# Part of the sidecar cache signature; bump it when parsing output changes so
+# caches written by an older parser are ignored
+_PARSER_VERSION = 2
+
 
 def parse_prolog_fact(fact_str: str) -> Optional[Fact]:
     """
@@ -46,11 +67,12 @@ def parse_prolog_fact(fact_str: str) -> Optional[Fact]:
     fact_str = fact_str.strip().rstrip('.')
     
     # Match predicate(arg1, arg2, ...)
-    match = re.match(r'(\w+)\((.*?)\)', fact_str)
+    match = _FACT_RE.match(fact_str)
     if not match:
         return None
     
-    predicate = match.group(1)
+    # Interned so repeated atoms share one string (Fact's symbol table then hits by identity)
+    predicate = sys.intern(match.group(1))
     args_str = match.group(2)
     
     if not args_str:
@@ -65,12 +87,12 @@ def parse_prolog_fact(fact_str: str) -> Optional[Fact]:
         if arg == '_':
             # Anonymous variable
             args.append('?_')
-        elif arg and arg[0].isupper():
+        elif arg[:1].isupper():
             # Prolog variable -> Python variable
             args.append(f'?{arg}')
         else:
             # Constant (atom)
-            args.append(arg)
+            args.append(sys.intern(arg))
     
     return Fact(predicate, *tuple(args))
 
@@ -86,26 +108,25 @@ def split_premises(premises_str: str) -> List[str]:
         List of individual premise strings
     """
     premises = []
-    current = ""
+    start = 0
     paren_depth = 0
     
-    for char in premises_str:
+    # Visit only parentheses and commas, slicing out a premise at each top-level comma
+    for match in _DELIMITER_RE.finditer(premises_str):
+        char = match.group()
         if char == '(':
             paren_depth += 1
-            current += char
         elif char == ')':
             paren_depth -= 1
-            current += char
-        elif char == ',' and paren_depth == 0:
+        elif paren_depth == 0:
             # Split here
-            premises.append(current.strip())
-            current = ""
-        else:
-            current += char
+            premises.append(premises_str[start:match.start()].strip())
+            start = match.end()
     
     # Add the last premise
-    if current.strip():
-        premises.append(current.strip())
+    last = premises_str[start:].strip()
+    if last:
+        premises.append(last)
     
     return premises
 
@@ -148,7 +169,7 @@ def parse_prolog_rule(rule_str: str) -> Optional[Rule]:
     
     for premise_str in premise_strs:
         # Skip special predicates like \= (not equal)
-        if '\\=' in premise_str or premise_str.startswith('_'):
+        if _NOT_EQUAL in premise_str or premise_str.startswith('_'):
             continue
             
         premise = parse_prolog_fact(premise_str)
@@ -185,6 +206,34 @@ def parse_prolog_line(line: str) -> Optional[Tuple[str, object]]:
     return None
 
 
+@lru_cache(maxsize=4096)
+def parse_prolog_line_cached(line: str) -> Optional[Tuple[str, object]]:
+    """
+    parse_prolog_line with memoization, for statements that are parsed repeatedly
+    (e.g. the same KB entries retrieved for many questions). The returned
+    Fact/Rule objects are shared, so callers must not modify them.
+    """
+    return parse_prolog_line(line)
+
+
+def _split_statements(text: str) -> Iterator[str]:
+    """Yield the statements of a Prolog text, without comments or end tokens."""
+    pieces = []
+    start = 0
+    # Only quotes, comments, line breaks and end tokens reach Python; the text
+    # between them is sliced out whole
+    for match in _STATEMENT_TOKEN_RE.finditer(text):
+        if match.group(1):
+            continue
+        pieces.append(text[start:match.start()])
+        start = match.end()
+        if match.group() == '.':
+            yield ''.join(pieces).strip()
+            pieces = []
+        else:
+            pieces.append(' ')
+
+
 def parse_prolog_file(filepath: str) -> Tuple[List[Fact], List[Rule]]:
     """
     Parse an entire Prolog file into facts and rules.
@@ -199,30 +248,55 @@ def parse_prolog_file(filepath: str) -> Tuple[List[Fact], List[Rule]]:
     rules = []
     
     with open(filepath, 'r') as f:
-        # Handle multi-line rules
-        current_statement = ""
+        text = f.read()
+    
+    # One regex pass over the whole file yields complete (multi-line) statements
+    for statement in _split_statements(text):
+        result = parse_prolog_line(statement)
+        if result:
+            kind, obj = result
+            if kind == "fact":
+                facts.append(obj)
+            elif kind == "rule":
+                rules.append(obj)
+    
+    return facts, rules
+
+
+def parse_prolog_file_cached(filepath: str) -> Tuple[List[Fact], List[Rule]]:
+    """
+    Parse a Prolog file, reusing a pickled result from a previous run.
+    
+    The parse is stored next to the file (<filepath>.parsed.pkl) together with
+    the file's mtime and size, and reused while both (and _PARSER_VERSION)
+    are unchanged.
+    
+    Args:
+        filepath: Path to Prolog file
         
-        for line in f:
-            line = line.strip()
-            
-            # Skip comments and empty lines
-            if not line or line.startswith('%'):
-                continue
-            
-            # Accumulate multi-line statements
-            current_statement += " " + line
-            
-            # If statement ends with period, process it
-            if current_statement.strip().endswith('.'):
-                result = parse_prolog_line(current_statement)
-                if result:
-                    kind, obj = result
-                    if kind == "fact":
-                        facts.append(obj)
-                    elif kind == "rule":
-                        rules.append(obj)
-                
-                current_statement = ""
+    Returns:
+        (facts, rules) tuple
+    """
+    cache_path = filepath + ".parsed.pkl"
+    stat = os.stat(filepath)
+    signature = (stat.st_mtime, stat.st_size, _PARSER_VERSION)
+    
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_signature, facts, rules = pickle.load(f)
+        if cached_signature == signature:
+            return facts, rules
+    except Exception:
+        pass  # Missing, stale or unreadable cache: parse again
+    
+    facts, rules = parse_prolog_file(filepath)
+    try:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((signature, facts, rules), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # Caching is best effort (e.g. read-only directory)
     
     return facts, rules
 
@@ -236,15 +310,13 @@ def convert_to_python_variable(prolog_var: str) -> str:
         "Boss" -> "?Boss"
         "mordecai" -> "mordecai" (not a variable)
     """
-    if prolog_var and prolog_var[0].isupper():
+    if prolog_var[:1].isupper():
         return f"?{prolog_var}"
     return prolog_var
 
 
 if __name__ == "__main__":
     # Example usage
-    import sys
-    
     if len(sys.argv) > 1:
         # Parse file provided as argument
         kb_path = sys.argv[1]
@@ -0,0 +1,186 @@
+"""
+Tests for kb_to_chromadb ingestion and the query_kb cache. Needs chromadb
+installed; ChromaDB itself is replaced by in-memory stand-ins, so nothing is
+embedded or stored.
+
+Run with pytest.
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import kb_to_chromadb
+except ImportError:  # chromadb not installed
+    kb_to_chromadb = None
+
+from prolog_parser import parse_prolog_file
+
+
+def _require_chromadb():
+    if kb_to_chromadb is None:
+        raise unittest.SkipTest("chromadb is not installed")
+
+
+class RecordingCollection:
+    """Stands in for a ChromaDB collection: keeps every add() payload."""
+    
+    def __init__(self):
+        self.documents, self.metadatas, self.ids = [], [], []
+    
+    def add(self, documents, metadatas, ids):
+        assert len(documents) == len(metadatas) == len(ids)
+        self.documents += documents
+        self.metadatas += metadatas
+        self.ids += ids
+
+
+class RecordingClient:
+    """Stands in for a ChromaDB client that has no collections yet."""
+    
+    def __init__(self):
+        self.collection = RecordingCollection()
+    
+    def delete_collection(self, name):
+        raise ValueError(f"Collection {name} does not exist")
+    
+    def create_collection(self, name, metadata=None):
+        return self.collection
+
+
+def ingest(kb_text: str) -> RecordingCollection:
+    """Ingest a Prolog text into a recording collection, restoring the module state afterwards."""
+    client = RecordingClient()
+    saved = (kb_to_chromadb._get_client, kb_to_chromadb.KB_BACKEND, kb_to_chromadb._kb_version,
+             dict(kb_to_chromadb._COLLECTIONS))
+    kb_to_chromadb._get_client = lambda db_path: client
+    kb_to_chromadb.KB_BACKEND = "chroma"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "kb.pl")
+            with open(path, 'w') as f:
+                f.write(kb_text)
+            kb_to_chromadb.ingest_kb_to_chromadb(path, "test_kb")
+    finally:
+        kb_to_chromadb._get_client, kb_to_chromadb.KB_BACKEND, kb_to_chromadb._kb_version, collections = saved
+        kb_to_chromadb._COLLECTIONS.clear()
+        kb_to_chromadb._COLLECTIONS.update(collections)
+        kb_to_chromadb._query_cache.clear()
+    return client.collection
+
+
+KB_TEXT = """
+park_worker(mordecai).
+character_type(rigby, raccoon).
+likes(pops, lollipops).
+in_charge_of(Boss, Worker) :- reports_to(Worker, Boss).
+snack_time(X) :- likes(X, _).
+"""
+
+
+def test_ingest_builds_ids_documents_and_metadatas():
+    """Facts and rules become fact_i / rule_i entries with their description and metadata."""
+    _require_chromadb()
+    collection = ingest(KB_TEXT)
+    payload = {id_: (document, metadata) for id_, document, metadata
+               in zip(collection.ids, collection.documents, collection.metadatas)}
+    
+    assert len(payload) == len(collection.ids) == 5
+    assert payload == {
+        "fact_0": ("mordecai is a park worker",
+                   {"prolog": "park_worker(mordecai)", "predicate": "park_worker", "type": "fact"}),
+        "fact_1": ("rigby is a raccoon",
+                   {"prolog": "character_type(rigby, raccoon)", "predicate": "character_type", "type": "fact"}),
+        "fact_2": ("likes(pops, lollipops)",
+                   {"prolog": "likes(pops, lollipops)", "predicate": "likes", "type": "fact"}),
+        "rule_0": ("Someone is in charge of another person if that person reports to them",
+                   {"prolog": "in_charge_of(?Boss, ?Worker) :- reports_to(?Worker, ?Boss)",
+                    "predicate": "in_charge_of", "type": "rule"}),
+        "rule_1": ("Rule: snack_time(?X) :- likes(?X, ?_)",
+                   {"prolog": "snack_time(?X) :- likes(?X, ?_)", "predicate": "snack_time", "type": "rule"}),
+    }
+
+
+def test_ingest_payload_matches_document_builders():
+    """Every parsed fact and rule of the sample KB is ingested once, as create_*_document describes it."""
+    _require_chromadb()
+    sample_kb = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_4', 'regular_show_kb.pl')
+    with open(sample_kb) as f:
+        collection = ingest(f.read())
+    facts, rules = parse_prolog_file(sample_kb)
+    
+    expected = {}
+    for prefix, items, build in (("fact", facts, kb_to_chromadb.create_fact_document),
+                                 ("rule", rules, kb_to_chromadb.create_rule_document)):
+        for i, item in enumerate(items):
+            text, prolog, predicate, doc_type = build(item)
+            expected[f"{prefix}_{i}"] = (text, {"prolog": prolog, "predicate": predicate, "type": doc_type})
+    
+    assert sorted(collection.ids) == sorted(expected)
+    assert dict(zip(collection.ids, zip(collection.documents, collection.metadatas))) == expected
+
+
+class CountingSearch:
+    """Stands in for search_collection: records each query and answers with the current KB version."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def __call__(self, queries, collection_name="regular_show_kb", n_results=10):
+        self.calls.extend(queries)
+        return [[{"prolog": f"answer({kb_to_chromadb.kb_version()})", "query": query}] for query in queries]
+
+
+def with_counting_search(test):
+    """Run test(search) against an empty query cache, restoring the module state afterwards."""
+    def run():
+        _require_chromadb()
+        search = CountingSearch()
+        saved = kb_to_chromadb.search_collection, kb_to_chromadb._kb_version
+        kb_to_chromadb.search_collection = search
+        kb_to_chromadb._query_cache.clear()
+        try:
+            test(search)
+        finally:
+            kb_to_chromadb.search_collection, kb_to_chromadb._kb_version = saved
+            kb_to_chromadb._query_cache.clear()
+    run.__name__ = test.__name__
+    run.__doc__ = test.__doc__
+    return run
+
+
+@with_counting_search
+def test_repeated_query_is_cached(search):
+    """A repeated question is answered from the cache, with copies callers may modify."""
+    first = kb_to_chromadb.query_kb("Who is in charge of Mordecai?")
+    first[0]["prolog"] = "modified"
+    second = kb_to_chromadb.query_kb("Who is in charge of Mordecai?")
+    
+    assert search.calls == ["Who is in charge of Mordecai?"]
+    assert second[0]["prolog"] == "answer(0)"
+    
+    # n_results is part of the key
+    kb_to_chromadb.query_kb("Who is in charge of Mordecai?", n_results=5)
+    assert len(search.calls) == 2
+
+
+@with_counting_search
+def test_kb_version_change_invalidates_cache(search):
+    """Results cached under an older KB version are not served once the version changes."""
+    questions = ["Who is in charge of Mordecai?", "Is Benson a boss?"]
+    kb_to_chromadb.query_kb_batch(questions)
+    kb_to_chromadb.query_kb_batch(questions)
+    assert search.calls == questions
+    
+    kb_to_chromadb._kb_version += 1  # What ingest_kb_to_chromadb does, minus clearing the cache
+    results = kb_to_chromadb.query_kb_batch(questions)
+    
+    assert search.calls == questions * 2
+    assert [docs[0]["prolog"] for docs in results] == [f"answer({kb_to_chromadb.kb_version()})"] * 2
+    
+    kb_to_chromadb.query_kb(questions[0])
+    assert search.calls == questions * 2
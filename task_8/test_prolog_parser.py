@@ -0,0 +1,95 @@
+"""
+Tests for the Prolog parser and its pickle sidecar cache.
+
+Run with pytest.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prolog_parser import Fact, Rule, parse_prolog_file, parse_prolog_file_cached
+
+SAMPLE_KB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_4', 'regular_show_kb.pl')
+
+
+def test_editing_file_invalidates_sidecar_cache():
+    """A cached parse is reused only until the .pl file changes, even when its size stays the same."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.pl")
+        shutil.copy(SAMPLE_KB, path)
+        
+        facts, rules = parse_prolog_file_cached(path)
+        assert os.path.exists(path + ".parsed.pkl")
+        assert parse_prolog_file_cached(path) == (facts, rules)
+        
+        # Same size, new content and mtime
+        size = os.stat(path).st_size
+        with open(path) as f:
+            text = f.read()
+        with open(path, 'w') as f:
+            f.write(text.replace("park_worker(mordecai)", "park_worker(mordecay)"))
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+        assert stat.st_size == size
+        
+        edited_facts, _ = parse_prolog_file_cached(path)
+        assert Fact("park_worker", "mordecay") in edited_facts
+        assert Fact("park_worker", "mordecai") not in edited_facts
+        
+        # Appending a statement changes the size
+        with open(path, 'a') as f:
+            f.write("\npark_worker(thomas).\n")
+        appended_facts, _ = parse_prolog_file_cached(path)
+        assert appended_facts == edited_facts + [Fact("park_worker", "thomas")]
+        assert parse_prolog_file_cached(path) == parse_prolog_file(path)
+
+
+QUOTED_KB = """% A comment. With an end token in it
+says(pops, 'Jolly good. Jolly good').   % trailing comment
+discount(store, '100%').
+quote(skips, "Don't. Stop").
+symbol(dot, 0'.).
+reminder(benson,
+         'Get back to work. Now').
+escaped(rigby, 'It\\'s. Fine').
+hates(X, Y) :- % why
+    rivals(X, Y).
+"""
+
+
+def parse_text(text):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "kb.pl")
+        with open(path, 'w') as f:
+            f.write(text)
+        return parse_prolog_file(path)
+
+
+def test_quoted_atoms_and_strings_are_kept_whole():
+    """A '%' or '. ' inside quotes neither starts a comment nor ends the statement."""
+    facts, rules = parse_text(QUOTED_KB)
+    
+    assert facts == [
+        Fact("says", "pops", "'Jolly good. Jolly good'"),
+        Fact("discount", "store", "'100%'"),
+        Fact("quote", "skips", '"Don\'t. Stop"'),
+        Fact("symbol", "dot", "0'."),
+        Fact("reminder", "benson", "'Get back to work. Now'"),
+        Fact("escaped", "rigby", "'It\\'s. Fine'"),
+    ]
+    assert rules == [Rule(Fact("hates", "?X", "?Y"), [Fact("rivals", "?X", "?Y")])]
+
+
+def test_sample_kb_statements_split_as_written():
+    """Every statement of the sample KB is parsed; comments are dropped."""
+    with open(SAMPLE_KB) as f:
+        text = f.read()
+    facts, rules = parse_prolog_file(SAMPLE_KB)
+    
+    statements = [line for line in text.splitlines() if line.strip() and not line.lstrip().startswith('%')]
+    assert len(facts) + len(rules) == sum(line.rstrip().endswith('.') for line in statements)
+    assert parse_text(text) == (facts, rules)
@@ -28,7 +28,10 @@ env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
 # Import from task_8 for KB setup
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'task_8'))
+_TASK_8_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_8')
+if _TASK_8_DIR not in sys.path:
+    sys.path.append(_TASK_8_DIR)
+import kb_to_chromadb
 from kb_to_chromadb import ingest_kb_to_chromadb
 
 from langgraph_reasoner import LangGraphReasoner
@@ -40,10 +43,15 @@ def setup_kb():
     print("SETUP: Checking ChromaDB")
     print("=" * 80)
     
-    # Check if task_8 ChromaDB exists (we can reuse it)
-    task8_db = os.path.join(os.path.dirname(__file__), '..', 'task_8', 'chroma_db')
+    # Check if task_8 ChromaDB (or sqlite-vec database) exists (we can reuse it)
+    if kb_to_chromadb.KB_BACKEND == "sqlite-vec":
+        task8_db = kb_to_chromadb.VEC_DB_PATH
+        db_exists = os.path.exists(task8_db)
+    else:
+        task8_db = os.path.join(os.path.dirname(__file__), '..', 'task_8', 'chroma_db')
+        db_exists = os.path.exists(task8_db) and os.listdir(task8_db)
     
-    if os.path.exists(task8_db) and os.listdir(task8_db):
+    if db_exists:
         print("✓ Using existing ChromaDB from task_8")
         # Update the KB path in query_kb to use task_8's DB
         return
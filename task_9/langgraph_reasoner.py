@@ -9,9 +9,10 @@ This module uses LangGraph to create a stateful reasoning pipeline with:
 - Explainable traces
 
 LangGraph State Machine:
-1. retrieve → Judge relevancy
-2. If low relevancy → refine (additional retrieval)
-3. parse → build_kb → infer → format
+1. retrieve → parse the question and judge relevancy in one LLM call (only parse
+   when facts and rules were both retrieved)
+2. If low relevancy → refine (additional retrieval) → re-judge
+3. build_kb → infer → format
 4. Return result with trace
 
 Key improvements over Task 8:
@@ -23,58 +24,331 @@ Key improvements over Task 8:
 
 import os
 import sys
-from typing import Dict, List, TypedDict, Annotated
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set, Tuple, TypedDict, Annotated
 from dotenv import load_dotenv
 import operator
 
 # LangChain and LangGraph imports
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
+from langchain_community.cache import SQLiteCache
+from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
 
 # Import from task_8
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'task_8'))
+_TASK_8_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_8')
+if _TASK_8_DIR not in sys.path:
+    sys.path.append(_TASK_8_DIR)
 import kb_to_chromadb
-from prolog_parser import parse_prolog_line, parse_prolog_fact
+from prolog_parser import parse_prolog_line_cached, parse_prolog_fact
 
-# Wrapper to use task_8's ChromaDB
+# Wrapper to use task_8's vector store (ChromaDB, or sqlite-vec with KB_BACKEND=sqlite-vec)
 def query_kb(query: str, n_results: int = 15):
-    """Query ChromaDB from task_8."""
-    import chromadb
-    db_path = os.path.join(os.path.dirname(__file__), '..', 'task_8', 'chroma_db')
-    client = chromadb.PersistentClient(path=db_path)
-    collection = client.get_collection("regular_show_kb")
-    
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
-    
-    documents = []
-    for i in range(len(results['documents'][0])):
-        documents.append({
-            "text": results['documents'][0][i],
-            "prolog": results['metadatas'][0][i]['prolog'],
-            "predicate": results['metadatas'][0][i]['predicate'],
-            "type": results['metadatas'][0][i]['type']
-        })
-    
-    return documents
+    """Query the KB from task_8."""
+    return query_kb_batch([query], n_results)[0]
+
+
+def query_kb_batch(queries: List[str], n_results: int = 15) -> List[List[Dict]]:
+    """Query the KB from task_8 for several queries in one round-trip (one list per query)."""
+    # Uncached search: LangGraphReasoner caches retrievals itself. The client (or sqlite-vec
+    # connection) is opened once per process and reused, and question embeddings are cached
+    return kb_to_chromadb.search_collection(queries, "regular_show_kb", n_results)
+
+
+def count_doc_types(docs: List[Dict], counts: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Count documents by type ('fact'/'rule') in one pass, adding to counts if given."""
+    counts = dict(counts) if counts else {"fact": 0, "rule": 0}
+    for doc in docs:
+        doc_type = doc['type']
+        counts[doc_type] = counts.get(doc_type, 0) + 1
+    return counts
+
+
+def expand_query(question: str) -> str:
+    """
+    Predict the refinement query for a question.
+    
+    The judge mostly asks for more context when the inference rules behind a
+    derived relationship are missing, so this asks for those rules directly.
+    """
+    return f"Rules that define: {question}"
+
+
+# On-disk cache of LLM responses (judge, parse and format prompts are deterministic at temperature 0)
+DEFAULT_LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.llm_cache.db')
+
+# Static start of every system prompt (judge, parse, format). OpenAI caches byte-identical
+# prompt prefixes of 1024+ tokens, so the schema and worked examples come first, shared by
+# all three nodes, and the node-specific instructions follow. No braces: it is a template.
+_STATIC_PREFIX = """You are part of a reasoning pipeline that answers natural language questions about the Regular Show knowledge base. Relevant facts and rules are retrieved from a vector store, their relevancy is judged, the question is parsed into a Prolog query, the query is proved by backward chaining, and the result is explained in natural language.
+
+Knowledge base schema:
+- park_worker(X): X is a park worker (mordecai, rigby, skips, muscle_man, hi_five_ghost)
+- boss(X): X is a boss (benson)
+- park_manager(X): X is the park manager (pops)
+- character_type(X, Type): X is a Type (blue_jay, raccoon, gumball_machine, yeti, lollipop, green_man, ghost)
+- friends(X, Y): X and Y are friends (mordecai and rigby, muscle_man and hi_five_ghost)
+- reports_to(X, Y): X reports to Y (the park workers report to benson, benson reports to pops)
+
+Derived predicates (rules):
+- in_charge_of(Boss, Worker) :- reports_to(Worker, Boss).
+- work_together(X, Y) :- park_worker(X), park_worker(Y), X \\= Y.
+- has_authority(X) :- boss(X).
+- has_authority(X) :- park_manager(X).
+- is_subordinate(X) :- reports_to(X, _).
+
+A derived predicate can only be proved if its rule is among the retrieved documents; facts alone are not enough.
+
+Worked examples (question, Prolog query, deduction, answer):
+
+Q: "Is Benson in charge of Mordecai?"
+Query: in_charge_of(benson, mordecai)
+Deduction: in_charge_of(Boss, Worker) :- reports_to(Worker, Boss); reports_to(mordecai, benson) is a fact.
+Answer: Yes. Mordecai reports to Benson, so Benson is in charge of Mordecai.
+
+Q: "Is Pops in charge of Benson?"
+Query: in_charge_of(pops, benson)
+Deduction: in_charge_of(Boss, Worker) :- reports_to(Worker, Boss); reports_to(benson, pops) is a fact.
+Answer: Yes. Benson reports to Pops, so Pops is in charge of Benson.
+
+Q: "Is Rigby in charge of Mordecai?"
+Query: in_charge_of(rigby, mordecai)
+Deduction: in_charge_of(Boss, Worker) :- reports_to(Worker, Boss); there is no fact reports_to(mordecai, rigby).
+Answer: No. Mordecai does not report to Rigby, so Rigby is not in charge of him.
+
+Q: "Are Mordecai and Rigby friends?"
+Query: friends(mordecai, rigby)
+Deduction: friends(mordecai, rigby) is a fact.
+Answer: Yes, Mordecai and Rigby are friends.
+
+Q: "Are Skips and Benson friends?"
+Query: friends(skips, benson)
+Deduction: there is no fact friends(skips, benson) and no rule for friends.
+Answer: No, the knowledge base does not say Skips and Benson are friends.
+
+Q: "Is Mordecai a park worker?"
+Query: park_worker(mordecai)
+Deduction: park_worker(mordecai) is a fact.
+Answer: Yes, Mordecai is a park worker.
+
+Q: "Is Pops a park worker?"
+Query: park_worker(pops)
+Deduction: there is no fact park_worker(pops).
+Answer: No, Pops is the park manager, not a park worker.
+
+Q: "Does Benson have authority?"
+Query: has_authority(benson)
+Deduction: has_authority(X) :- boss(X); boss(benson) is a fact.
+Answer: Yes. Benson is a boss, so he has authority.
+
+Q: "Does Pops have authority?"
+Query: has_authority(pops)
+Deduction: has_authority(X) :- park_manager(X); park_manager(pops) is a fact.
+Answer: Yes. Pops is the park manager, so he has authority.
+
+Q: "Does Rigby have authority?"
+Query: has_authority(rigby)
+Deduction: rigby is neither a boss nor a park manager, so neither has_authority rule applies.
+Answer: No, Rigby is neither a boss nor the park manager.
+
+Q: "Do Mordecai and Rigby work together?"
+Query: work_together(mordecai, rigby)
+Deduction: work_together(X, Y) :- park_worker(X), park_worker(Y), X \\= Y; both are park workers and they are different.
+Answer: Yes. Mordecai and Rigby are both park workers, so they work together.
+
+Q: "Do Benson and Mordecai work together?"
+Query: work_together(benson, mordecai)
+Deduction: work_together needs park_worker(benson), which is not a fact.
+Answer: No. Benson is not a park worker, so by the rule they do not work together.
+
+Q: "Is Skips a subordinate?"
+Query: is_subordinate(skips)
+Deduction: is_subordinate(X) :- reports_to(X, _); reports_to(skips, benson) is a fact.
+Answer: Yes. Skips reports to Benson, so he is a subordinate.
+
+Q: "Is Pops a subordinate?"
+Query: is_subordinate(pops)
+Deduction: is_subordinate(X) :- reports_to(X, _); pops reports to no one.
+Answer: No. Pops does not report to anyone, so he is not a subordinate.
+
+Q: "What kind of character is Skips?"
+Query: character_type(skips, X)
+Deduction: character_type(skips, yeti) is a fact, so X = yeti.
+Answer: Skips is a yeti.
+
+Q: "Who is in charge of Rigby?"
+Query: in_charge_of(X, rigby)
+Deduction: in_charge_of(Boss, Worker) :- reports_to(Worker, Boss); reports_to(rigby, benson) gives X = benson.
+Answer: Benson is in charge of Rigby.
+
+Q: "Who does Benson report to?"
+Query: reports_to(benson, X)
+Deduction: reports_to(benson, pops) is a fact, so X = pops.
+Answer: Benson reports to Pops.
+
+Q: "Who are the park workers?"
+Query: park_worker(X)
+Deduction: park_worker facts give X = mordecai, rigby, skips, muscle_man, hi_five_ghost.
+Answer: The park workers are Mordecai, Rigby, Skips, Muscle Man and Hi Five Ghost.
+
+Q: "Who is Muscle Man friends with?"
+Query: friends(muscle_man, X)
+Deduction: friends(muscle_man, hi_five_ghost) is a fact, so X = hi_five_ghost.
+Answer: Muscle Man is friends with Hi Five Ghost.
+
+Q: "Who has authority?"
+Query: has_authority(X)
+Deduction: has_authority(X) :- boss(X) gives X = benson; has_authority(X) :- park_manager(X) gives X = pops.
+Answer: Benson (the boss) and Pops (the park manager) have authority.
+
+Q: "Is Hi Five Ghost a ghost?"
+Query: character_type(hi_five_ghost, ghost)
+Deduction: character_type(hi_five_ghost, ghost) is a fact.
+Answer: Yes, Hi Five Ghost is a ghost.
+"""
+
+# Retrieval cache of LangGraphReasoner: LRU over normalized questions, entries expire after the TTL
+RETRIEVAL_CACHE_SIZE = 512
+RETRIEVAL_CACHE_TTL = 300.0  # seconds
+
+# Retrievals with at least this many facts and rules, including some for the queried
+# predicate, skip the LLM relevancy judge
+JUDGE_SKIP_MIN_FACTS = 2
+JUDGE_SKIP_MIN_RULES = 2
+
+# Judgments scored in this (inclusive) range are uncertain and re-asked to the escalation model
+ESCALATION_SCORE_RANGE = (0.5, 0.85)
+
+
+def question_key(question: str) -> str:
+    """Cache key for a question: SHA-256 of its case- and whitespace-normalized text."""
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
 # Import backward chainer from task_7
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'task_7'))
+_TASK_7_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'task_7')
+if _TASK_7_DIR not in sys.path:
+    sys.path.append(_TASK_7_DIR)
 from backward_chain import Fact, Rule, KnowledgeBase, BackwardChainer
 
 # Load environment variables
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
+# Pipeline steps are logged at DEBUG with %-style arguments, so nothing is formatted
+# unless the logger is enabled. reason(verbose=True) enables it for that call only
+logger = logging.getLogger(__name__)
+_VERBOSE: ContextVar[bool] = ContextVar("langgraph_reasoner_verbose", default=False)
+_verbose_calls = 0  # Running verbose calls; the logger is at DEBUG while any is running
+_verbose_saved_level = logging.NOTSET
+_verbose_lock = threading.Lock()
+
+
+class _VerboseHandler(logging.Handler):
+    """Prints the records of verbose calls to stdout (sys.stdout at emit time)."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        return _VERBOSE.get() and super().filter(record)
+    
+    def emit(self, record: logging.LogRecord):
+        print(self.format(record))
+
+
+logger.addHandler(_VerboseHandler())
+logger.propagate = False  # Otherwise an application's root handler prints every verbose step again
+
+
+@contextmanager
+def _verbose_logging():
+    """Log this call's pipeline steps to stdout; concurrent quiet calls stay quiet."""
+    global _verbose_calls, _verbose_saved_level
+    token = _VERBOSE.set(True)
+    with _verbose_lock:
+        if _verbose_calls == 0:
+            _verbose_saved_level = logger.level
+            logger.setLevel(logging.DEBUG)
+        _verbose_calls += 1
+    try:
+        yield
+    finally:
+        with _verbose_lock:
+            _verbose_calls -= 1
+            if _verbose_calls == 0:
+                logger.setLevel(_verbose_saved_level)
+        _VERBOSE.reset(token)
+
+
+# Structured LLM outputs (validated JSON instead of free text parsed line by line)
+class Judgment(BaseModel):
+    """Relevancy judgment of the retrieved documents."""
+    score: float = Field(description="Relevancy score from 0.0 to 1.0")
+    explanation: str = Field(description="Why this score; mention if rules are missing")
+    refinement: str = Field(description='Suggested retrieval query, or "none"')
+
+
+class PrologQuery(BaseModel):
+    """A question translated into a Prolog query."""
+    query: str = Field(description="The Prolog query, e.g. in_charge_of(benson, mordecai)")
+
+
+class Preamble(BaseModel):
+    """Prolog query and relevancy judgment, produced by one LLM call."""
+    prolog: str = Field(description="The Prolog query, e.g. in_charge_of(benson, mordecai)")
+    score: float = Field(description="Relevancy score from 0.0 to 1.0")
+    explanation: str = Field(description="Why this score; mention if rules are missing")
+    refinement: str = Field(description='Suggested retrieval query, or "none"')
+
+
+# Node-specific instructions, appended to _STATIC_PREFIX. The preamble node sends the
+# parse and judge blocks together, so one call does the work of parse and judge_relevancy.
+_PARSE_INSTRUCTIONS = """
+You are an expert at converting natural language to Prolog queries.
+
+Available predicates:
+- park_worker(X), boss(X), park_manager(X)
+- character_type(X, Type)
+- friends(X, Y)
+- reports_to(X, Y)
+- in_charge_of(X, Y)
+- work_together(X, Y)
+- has_authority(X)
+- is_subordinate(X)
+
+Rules:
+- Use lowercase for entities (benson, mordecai)
+- Use uppercase for variables (X, Y)"""
+
+_JUDGE_INSTRUCTIONS = """
+Judge if the retrieved documents suffice to answer the question by backward chaining.
+Score 0.0-1.0: 0.9+ all needed facts and rules; 0.7-0.9 facts suffice; below 0.7 if the
+question needs a derived predicate (in_charge_of, has_authority, work_together,
+is_subordinate) whose rule (" :-") is missing, or key entities are missing."""
+
+_JUDGE_USER = """Question: {question}
+
+Retrieved Documents:
+{docs}
+"""
+
 
 # State definition for LangGraph
 class ReasoningState(TypedDict):
     """State object that flows through the LangGraph."""
     question: str
-    retrieved_docs: List[Dict]
+    # Nodes return only the documents they add; the reducers append/union them
+    retrieved_docs: Annotated[List[Dict], operator.add]
+    seen_prologs: Annotated[Set[str], operator.or_]  # 'prolog' of every retrieved doc, for dedup
+    prefetched_docs: List[Dict]  # Results of expand_query, used by the first refinement
+    doc_counts: Dict[str, int]  # Number of retrieved_docs per type ('fact', 'rule')
     relevancy_score: float
     relevancy_explanation: str
     needs_refinement: bool
@@ -84,6 +358,7 @@ class ReasoningState(TypedDict):
     inference_result: bool
     trace: str
     final_answer: str
+    stream_callback: Optional[Callable[[str], None]]  # Receives the final answer's tokens as generated
     iteration: int
     max_iterations: int
 
@@ -94,19 +369,85 @@ class LangGraphReasoner:
     
     Pipeline:
     1. retrieve: RAG retrieval from ChromaDB
-    2. judge_relevancy: LLM judges if retrieved docs are relevant
-    3. refine (conditional): If low relevancy, get more context
+    2. preamble: one LLM call that does 4 and judges if retrieved docs are relevant
+       (when facts or rules are missing; otherwise only parse runs)
+    3. refine (conditional): If low relevancy, get more context, then judge_relevancy again
     4. parse: Convert NL question to Fact
-    5. build_kb: Construct KnowledgeBase from docs
+    5. build_kb: Construct KnowledgeBase from docs (once judged relevant)
     6. infer: Backward chaining inference
     7. format: Generate final answer
     """
     
-    def __init__(self, model: str = "gpt-4o-mini", temperature: float = 0.0):
-        """Initialize the LangGraph reasoner."""
-        self.llm = ChatOpenAI(model=model, temperature=temperature)
+    def __init__(self, model: str = "gpt-4o-mini", temperature: float = 0.0,
+                 cache_path: Optional[str] = DEFAULT_LLM_CACHE_PATH,
+                 escalation_model: Optional[str] = "gpt-4o"):
+        """
+        Initialize the LangGraph reasoner.
+        
+        Args:
+            model: OpenAI model to use
+            temperature: Temperature for LLM
+            cache_path: SQLite file caching LLM responses (None disables it). The
+                key is the full prompt plus model settings, so editing a prompt
+                simply misses the cache. Only used at temperature 0.
+            escalation_model: Stronger model that re-judges relevancy when `model`
+                returns a score in ESCALATION_SCORE_RANGE (None disables it)
+        """
+        cache = SQLiteCache(database_path=cache_path) if cache_path and temperature == 0.0 else None
+        self.llm = ChatOpenAI(model=model, temperature=temperature, cache=cache)
+        self.strong_llm = ChatOpenAI(model=escalation_model, temperature=temperature, cache=cache) if escalation_model else None
+        # question_key -> (time stored, KB version, retrieved docs, prefetched docs)
+        self._retrieval_cache: "OrderedDict[str, Tuple[float, int, List[Dict], List[Dict]]]" = OrderedDict()
+        self._retrieval_cache_lock = threading.Lock()
+        self._build_chains()
         self.graph = self._build_graph()
     
+    def _build_chains(self):
+        """Build the prompt templates and LLM chains once; the nodes only invoke them."""
+        relevancy_prompt = ChatPromptTemplate.from_messages([
+            ("system", _STATIC_PREFIX + _JUDGE_INSTRUCTIONS + """
+Give the score, a short explanation and a refinement query (or "none")."""),
+            ("user", _JUDGE_USER + """
+Judge the relevancy:""")
+        ])
+        
+        parse_prompt = ChatPromptTemplate.from_messages([
+            ("system", _STATIC_PREFIX + _PARSE_INSTRUCTIONS + """
+- Return ONLY the Prolog query"""),
+            ("user", "{question}")
+        ])
+        
+        # Both instruction blocks in one prompt: the shared prefix is sent once
+        preamble_prompt = ChatPromptTemplate.from_messages([
+            ("system", _STATIC_PREFIX + _PARSE_INSTRUCTIONS + "\n" + _JUDGE_INSTRUCTIONS + """
+Give the Prolog query, the score, a short explanation and a refinement query (or "none")."""),
+            ("user", _JUDGE_USER + """
+Parse the question and judge the relevancy:""")
+        ])
+        
+        format_prompt = ChatPromptTemplate.from_messages([
+            ("system", _STATIC_PREFIX + """
+You are an expert at explaining logical reasoning.
+
+Given a question, result, and trace, provide a clear natural language answer.
+Be concise but mention the key deduction steps."""),
+            ("user", """Question: {question}
+Result: {result}
+Trace: {trace}
+
+Provide a natural language answer:""")
+        ])
+        
+        # Judging chains are (configured model, escalation model or None) pairs for _ajudge
+        def cascade(prompt: ChatPromptTemplate, schema: type) -> Tuple:
+            escalation = (prompt | self.strong_llm.with_structured_output(schema)) if self.strong_llm else None
+            return prompt | self.llm.with_structured_output(schema), escalation
+        
+        self._judge_chains = cascade(relevancy_prompt, Judgment)
+        self._preamble_chains = cascade(preamble_prompt, Preamble)
+        self._parse_chain = parse_prompt | self.llm.with_structured_output(PrologQuery)
+        self._format_chain = format_prompt | self.llm
+    
     def _build_graph(self) -> StateGraph:
         """Build the LangGraph state machine."""
         
@@ -115,6 +456,7 @@ class LangGraphReasoner:
         
         # Add nodes
         workflow.add_node("retrieve", self.retrieve_node)
+        workflow.add_node("preamble", self.preamble_node)
         workflow.add_node("judge_relevancy", self.judge_relevancy_node)
         workflow.add_node("refine", self.refine_node)
         workflow.add_node("parse", self.parse_node)
@@ -125,147 +467,181 @@ class LangGraphReasoner:
         # Set entry point
         workflow.set_entry_point("retrieve")
         
-        # Add edges
-        workflow.add_edge("retrieve", "judge_relevancy")
-        
-        # Conditional edge: refine if low relevancy
+        # Conditional edge: retrievals that lack facts or rules are judged in the same
+        # LLM call that parses the question; the others are parsed first, then judged
+        # only if nothing retrieved defines the queried predicate. (This replaces
+        # running parse and judge_relevancy as parallel branches: one call is cheaper
+        # than two concurrent ones, and skipping the judge needs the parsed predicate.)
         workflow.add_conditional_edges(
-            "judge_relevancy",
-            self.should_refine,
+            "retrieve",
+            self.route_after_retrieve,
             {
-                "refine": "refine",
+                "preamble": "preamble",
                 "parse": "parse"
             }
         )
         
-        workflow.add_edge("refine", "judge_relevancy")  # Re-judge after refinement
-        workflow.add_edge("parse", "build_kb")
+        # Conditional edge: refine if low relevancy
+        for judged in ("preamble", "judge_relevancy"):
+            workflow.add_conditional_edges(
+                judged,
+                self.should_refine,
+                {
+                    "refine": "refine",
+                    "build_kb": "build_kb"
+                }
+            )
+        
+        workflow.add_edge("refine", "judge_relevancy")  # Re-judge after refinement (question already parsed)
+        workflow.add_conditional_edges(
+            "parse",
+            self.route_after_parse,
+            {
+                "judge_relevancy": "judge_relevancy",
+                "build_kb": "build_kb"
+            }
+        )
         workflow.add_edge("build_kb", "infer")
         workflow.add_edge("infer", "format")
         workflow.add_edge("format", END)
         
         return workflow.compile()
     
+    def needs_judge(self, state: ReasoningState) -> bool:
+        """
+        Decide if the retrieval needs the LLM relevancy judge.
+        
+        The metadata answers "are facts and rules present, and do any of them
+        define the queried predicate?" without an LLM call. Before the question
+        is parsed only the counts can be checked.
+        """
+        doc_counts = state["doc_counts"]
+        if doc_counts["fact"] < JUDGE_SKIP_MIN_FACTS or doc_counts["rule"] < JUDGE_SKIP_MIN_RULES:
+            return True
+        
+        fact = state.get("parsed_fact")
+        return fact is not None and not any(
+            doc['predicate'] == fact.predicate for doc in state["retrieved_docs"]
+        )
+    
+    def route_after_retrieve(self, state: ReasoningState) -> str:
+        """Parse and judge in one call, or only parse when the retrieval may be sufficient."""
+        return "preamble" if self.needs_judge(state) else "parse"
+    
+    def route_after_parse(self, state: ReasoningState) -> str:
+        """Judge the retrieval unless it has facts and rules for the queried predicate."""
+        return "judge_relevancy" if self.needs_judge(state) else "build_kb"
+    
     def should_refine(self, state: ReasoningState) -> str:
         """
         Decide if we need to refine the retrieval.
         
         Logic:
         - If relevancy < 0.7 AND iterations < max: refine
-        - Otherwise: proceed to parse
+        - Otherwise: proceed to build the KB
         """
         if state["needs_refinement"] and state["iteration"] < state["max_iterations"]:
             return "refine"
-        return "parse"
+        return "build_kb"
     
-    def retrieve_node(self, state: ReasoningState) -> Dict:
+    async def retrieve_node(self, state: ReasoningState) -> Dict:
         """Node 1: Retrieve relevant documents from ChromaDB."""
-        print(f"\n[Node: Retrieve] Query: {state['question']}")
+        logger.debug("\n[Node: Retrieve] Query: %s", state['question'])
         
         # If this is a refinement iteration, use the refinement query
-        query = state.get("refinement_query", state["question"])
+        query = state.get("refinement_query") or state["question"]
         
-        # Retrieve from ChromaDB
-        docs = query_kb(query, n_results=15)
+        docs, prefetched_docs = await asyncio.to_thread(self._cached_retrieval, query)
         
-        print(f"  Retrieved {len(docs)} documents")
-        print(f"  - Facts: {sum(1 for d in docs if d['type'] == 'fact')}")
-        print(f"  - Rules: {sum(1 for d in docs if d['type'] == 'rule')}")
+        doc_counts = count_doc_types(docs)
+        
+        logger.debug("  Retrieved %d documents", len(docs))
+        logger.debug("  - Facts: %d", doc_counts['fact'])
+        logger.debug("  - Rules: %d", doc_counts['rule'])
         
         return {
             "retrieved_docs": docs,
+            "seen_prologs": {d['prolog'] for d in docs},
+            "doc_counts": doc_counts,
+            "prefetched_docs": prefetched_docs,
             "iteration": state.get("iteration", 0)
         }
     
-    def judge_relevancy_node(self, state: ReasoningState) -> Dict:
+    def _cached_retrieval(self, query: str) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Retrieve docs for a query and for its expand_query, served from the
+        retrieval cache when the same (normalized) question was asked recently.
+        """
+        key = question_key(query)
+        kb_version = kb_to_chromadb.kb_version()  # Re-ingesting the KB invalidates entries
+        with self._retrieval_cache_lock:
+            entry = self._retrieval_cache.get(key)
+            if entry is not None and entry[1] == kb_version and time.monotonic() - entry[0] < RETRIEVAL_CACHE_TTL:
+                self._retrieval_cache.move_to_end(key)
+                logger.debug("  (retrieval cache hit)")
+                return list(entry[2]), list(entry[3])
+        
+        # Retrieve from ChromaDB, together with the likely refinement query (same
+        # round-trip), so a first refinement needs no second query
+        docs, prefetched_docs = query_kb_batch([query, expand_query(query)], n_results=15)
+        
+        with self._retrieval_cache_lock:
+            self._retrieval_cache[key] = (time.monotonic(), kb_version, docs, prefetched_docs)
+            self._retrieval_cache.move_to_end(key)
+            while len(self._retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+                self._retrieval_cache.popitem(last=False)
+        return list(docs), list(prefetched_docs)
+    
+    async def judge_relevancy_node(self, state: ReasoningState) -> Dict:
         """Node 2: Judge relevancy of retrieved documents using LLM."""
-        print(f"\n[Node: Judge Relevancy]")
+        logger.debug("\n[Node: Judge Relevancy]")
         
-        # Create prompt for relevancy judgment
-        relevancy_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert at judging document relevancy for logical reasoning tasks.
-
-Given a question and retrieved documents, judge if the documents contain enough relevant information to answer the question.
-
-**CRITICAL**: For questions that require inference (e.g., "Is X in charge of Y?"), you MUST check:
-1. Are the key entities mentioned? (e.g., Benson, Mordecai)
-2. Are direct facts present? (e.g., reports_to relationships)
-3. **Are inference RULES present?** (e.g., in_charge_of rules)
-
-If the question asks about a derived relationship (in_charge_of, has_authority, work_together, etc.) 
-but NO RULES are retrieved, score MUST be < 0.7 even if facts are present.
-
-Rules are identified by " :-" syntax: "predicate(X,Y) :- condition1, condition2"
-
-Scoring:
-- 0.9-1.0: All necessary facts AND rules present
-- 0.7-0.9: Facts present, rules may help but not essential
-- 0.4-0.7: Facts present but missing critical rules
-- 0.0-0.4: Missing key information
-
-Respond with:
-SCORE: <float>
-EXPLANATION: <why this score, mention if rules are missing>
-REFINEMENT: <suggested query or "none">"""),
-            ("user", """Question: {question}
-
-Retrieved Documents:
-{docs}
-
-Count:
-- Facts: {fact_count}
-- Rules: {rule_count}
-
-Judge the relevancy:""")
-        ])
+        # Get LLM judgment (validated Judgment object; a malformed response raises)
+        judgment = await self._ajudge(self._judge_chains, self._judge_inputs(state))
+        
+        return self._judgment_update(state, judgment.score, judgment.explanation, judgment.refinement)
+    
+    async def _ajudge(self, chains: Tuple, inputs: Dict):
+        """
+        Run a judging prompt as a cascade: the configured model's chain first, and
+        the escalation model's chain (same prompt) only if the score is uncertain.
+        """
+        chain, escalation_chain = chains
+        judgment = await chain.ainvoke(inputs)
+        
+        low, high = ESCALATION_SCORE_RANGE
+        if escalation_chain is not None and low <= judgment.score <= high:
+            logger.debug("  Uncertain score %.2f - escalating to the stronger model", judgment.score)
+            judgment = await escalation_chain.ainvoke(inputs)
         
+        return judgment
+    
+    def _judge_inputs(self, state: ReasoningState) -> Dict:
+        """Prompt variables of the relevancy judgment."""
         # Format docs for prompt
         docs_str = "\n".join([
             f"{i+1}. [{d['type']}] {d['prolog']}"
             for i, d in enumerate(state["retrieved_docs"][:10])
         ])
         
-        # Count facts and rules
-        fact_count = sum(1 for d in state["retrieved_docs"] if d['type'] == 'fact')
-        rule_count = sum(1 for d in state["retrieved_docs"] if d['type'] == 'rule')
-        
-        # Get LLM judgment
-        chain = relevancy_prompt | self.llm
-        response = chain.invoke({
+        # The [fact]/[rule] tags carry the type, so no separate counts are sent
+        return {
             "question": state["question"],
-            "docs": docs_str,
-            "fact_count": fact_count,
-            "rule_count": rule_count
-        })
-        
-        # Parse response
-        response_text = response.content
-        lines = response_text.strip().split('\n')
-        
-        score = 0.8  # Default
-        explanation = "Documents appear relevant"
-        refinement = "none"
-        
-        for line in lines:
-            if line.startswith("SCORE:"):
-                try:
-                    score = float(line.split("SCORE:")[1].strip())
-                except:
-                    pass
-            elif line.startswith("EXPLANATION:"):
-                explanation = line.split("EXPLANATION:")[1].strip()
-            elif line.startswith("REFINEMENT:"):
-                refinement = line.split("REFINEMENT:")[1].strip()
-        
+            "docs": docs_str
+        }
+    
+    def _judgment_update(self, state: ReasoningState, score: float, explanation: str, refinement: str) -> Dict:
+        """State update for a relevancy judgment."""
+        refinement = refinement.strip()
         needs_refinement = score < 0.7 and refinement.lower() != "none"
         
-        print(f"  Relevancy Score: {score:.2f}")
-        print(f"  Explanation: {explanation}")
+        logger.debug("  Relevancy Score: %.2f", score)
+        logger.debug("  Explanation: %s", explanation)
         if needs_refinement:
-            print(f"  Low relevancy - refinement needed")
-            print(f"  Refinement query: {refinement}")
+            logger.debug("  Low relevancy - refinement needed")
+            logger.debug("  Refinement query: %s", refinement)
         else:
-            print(f"  ✓ Relevancy sufficient")
+            logger.debug("  ✓ Relevancy sufficient")
         
         return {
             "relevancy_score": score,
@@ -274,80 +650,100 @@ Judge the relevancy:""")
             "refinement_query": refinement if needs_refinement else state["question"]
         }
     
-    def refine_node(self, state: ReasoningState) -> Dict:
+    async def refine_node(self, state: ReasoningState) -> Dict:
         """Node 3: Refine retrieval with additional context."""
-        print(f"\n[Node: Refine] Iteration {state['iteration'] + 1}")
-        print(f"  Using refined query: {state['refinement_query']}")
-        
-        # Retrieve with refined query
-        additional_docs = query_kb(state['refinement_query'], n_results=10)
-        
-        # Merge with existing docs (avoid duplicates)
-        existing_prolog = {d['prolog'] for d in state['retrieved_docs']}
-        new_docs = [d for d in additional_docs if d['prolog'] not in existing_prolog]
+        logger.debug("\n[Node: Refine] Iteration %d", state['iteration'] + 1)
         
-        combined_docs = state['retrieved_docs'] + new_docs
-        
-        print(f"  Added {len(new_docs)} new documents")
-        print(f"  Total documents: {len(combined_docs)}")
+        if state.get("prefetched_docs"):
+            # First refinement: use the expanded query's results fetched with the question
+            logger.debug("  Using prefetched results for: %s", expand_query(state['question']))
+            additional_docs = state["prefetched_docs"][:10]
+        else:
+            # Retrieve with refined query
+            logger.debug("  Using refined query: %s", state['refinement_query'])
+            additional_docs = await asyncio.to_thread(query_kb, state['refinement_query'], n_results=10)
+        
+        # Keep only unseen docs; the state reducers append them to retrieved_docs
+        # and add them to seen_prologs, so the existing list is never copied
+        seen = state['seen_prologs']
+        new_prologs = set()
+        new_docs = []
+        for d in additional_docs:
+            prolog = d['prolog']
+            if prolog not in seen and prolog not in new_prologs:
+                new_prologs.add(prolog)
+                new_docs.append(d)
+        
+        logger.debug("  Added %d new documents", len(new_docs))
+        logger.debug("  Total documents: %d", len(state['retrieved_docs']) + len(new_docs))
         
         return {
-            "retrieved_docs": combined_docs,
+            "retrieved_docs": new_docs,
+            "seen_prologs": new_prologs,
+            "doc_counts": count_doc_types(new_docs, state["doc_counts"]),
+            "prefetched_docs": [],  # Used up; later refinements query the judge's suggestion
             "iteration": state["iteration"] + 1,
             "needs_refinement": False  # Reset for re-judgment
         }
     
-    def parse_node(self, state: ReasoningState) -> Dict:
+    async def parse_node(self, state: ReasoningState) -> Dict:
         """Node 4: Parse question to Fact using LLM."""
-        print(f"\n[Node: Parse Question]")
-        
-        # Create parse prompt
-        parse_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert at converting natural language to Prolog queries.
-
-Available predicates:
-- park_worker(X), boss(X), park_manager(X)
-- character_type(X, Type)
-- friends(X, Y)
-- reports_to(X, Y)
-- in_charge_of(X, Y)
-- work_together(X, Y)
-- has_authority(X)
-- is_subordinate(X)
-
-Rules:
-- Use lowercase for entities (benson, mordecai)
-- Use uppercase for variables (X, Y)
-- Return ONLY the Prolog query"""),
-            ("user", "{question}")
-        ])
-        
-        chain = parse_prompt | self.llm
-        response = chain.invoke({"question": state["question"]})
-        prolog_query = response.content.strip().replace("```", "")
-        
-        print(f"  Parsed query: {prolog_query}")
+        logger.debug("\n[Node: Parse Question]")
+        
+        response = await self._parse_chain.ainvoke({"question": state["question"]})
+        update = self._parsed_update(response.query)
+        
+        # Facts and rules for the queried predicate present: accept the retrieval
+        # without asking the LLM judge (route_after_parse skips it too)
+        if not self.needs_judge({**state, **update}):
+            logger.debug("  Skipping relevancy judge (facts and rules for the query present)")
+            update.update({
+                "relevancy_score": 1.0,
+                "relevancy_explanation": (
+                    f"Judge skipped: retrieved {state['doc_counts']['fact']} facts and "
+                    f"{state['doc_counts']['rule']} rules, including the queried predicate"
+                ),
+                "needs_refinement": False
+            })
+        
+        return update
+    
+    def _parsed_update(self, prolog_query: str) -> Dict:
+        """State update for the parsed Prolog query."""
+        prolog_query = prolog_query.strip()
+        logger.debug("  Parsed query: %s", prolog_query)
         
         # Convert to Fact
         fact = parse_prolog_fact(prolog_query)
         
         if not fact:
-            print(f"  ✗ Failed to parse query")
+            logger.debug("  ✗ Failed to parse query")
             return {"parsed_fact": None}
         
-        print(f"  ✓ Fact: {fact}")
+        logger.debug("  ✓ Fact: %s", fact)
         
         return {"parsed_fact": fact}
     
+    async def preamble_node(self, state: ReasoningState) -> Dict:
+        """Node 2+4: Parse the question and judge relevancy with one LLM call."""
+        logger.debug("\n[Node: Parse Question + Judge Relevancy]")
+        
+        preamble = await self._ajudge(self._preamble_chains, self._judge_inputs(state))
+        
+        update = self._parsed_update(preamble.prolog)
+        update.update(self._judgment_update(state, preamble.score, preamble.explanation, preamble.refinement))
+        return update
+    
     def build_kb_node(self, state: ReasoningState) -> Dict:
         """Node 5: Build KnowledgeBase from retrieved documents."""
-        print(f"\n[Node: Build Knowledge Base]")
+        logger.debug("\n[Node: Build Knowledge Base]")
         
         kb = KnowledgeBase()
         
         for doc in state["retrieved_docs"]:
             prolog_str = doc['prolog']
-            result = parse_prolog_line(prolog_str)
+            # Memoized for the process: the same KB entries come back for many questions
+            result = parse_prolog_line_cached(prolog_str)
             
             if result:
                 kind, obj = result
@@ -356,93 +752,124 @@ Rules:
                 elif kind == "rule":
                     kb.add_rule(obj)
         
-        print(f"  KB contains:")
-        print(f"  - {len(kb.facts)} facts")
-        print(f"  - {len(kb.rules)} rules")
+        logger.debug("  KB contains:")
+        logger.debug("  - %d facts", len(kb.facts))
+        logger.debug("  - %d rules", len(kb.rules))
         
         return {"knowledge_base": kb}
     
     def infer_node(self, state: ReasoningState) -> Dict:
         """Node 6: Run backward chaining inference."""
-        print(f"\n[Node: Backward Chaining Inference]")
+        logger.debug("\n[Node: Backward Chaining Inference]")
         
         if not state["parsed_fact"]:
-            print(f"  ✗ No fact to prove")
+            logger.debug("  ✗ No fact to prove")
             return {"inference_result": False, "trace": "Failed to parse question"}
         
-        # Create backward chainer
-        chainer = BackwardChainer(state["knowledge_base"], trace=True, max_depth=50)
+        # Create backward chainer; it appends its trace lines to trace_lines (no stdout
+        # capture, so concurrent reason() calls keep their traces apart)
+        trace_lines: List[str] = []
+        chainer = BackwardChainer(state["knowledge_base"], trace=True, max_depth=50, trace_sink=trace_lines)
+        result = chainer.prove(state["parsed_fact"])
         
-        # Capture trace
-        import io
-        from contextlib import redirect_stdout
+        trace = "\n".join(trace_lines)
         
-        trace_buffer = io.StringIO()
-        with redirect_stdout(trace_buffer):
-            result = chainer.prove(state["parsed_fact"])
-        
-        trace = trace_buffer.getvalue()
-        
-        print(f"  Query: {state['parsed_fact']}")
-        print(f"  Result: {result}")
+        logger.debug("  Query: %s", state['parsed_fact'])
+        logger.debug("  Result: %s", result)
         
         return {
             "inference_result": result,
             "trace": trace
         }
     
-    def format_node(self, state: ReasoningState) -> Dict:
+    async def format_node(self, state: ReasoningState) -> Dict:
         """Node 7: Format final answer."""
-        print(f"\n[Node: Format Answer]")
-        
-        # Create format prompt
-        format_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an expert at explaining logical reasoning.
-
-Given a question, result, and trace, provide a clear natural language answer.
-Be concise but mention the key deduction steps."""),
-            ("user", """Question: {question}
-Result: {result}
-Trace: {trace}
-
-Provide a natural language answer:""")
-        ])
+        logger.debug("\n[Node: Format Answer]")
         
-        chain = format_prompt | self.llm
-        response = chain.invoke({
+        inputs = {
             "question": state["question"],
             "result": state["inference_result"],
             "trace": state["trace"]
-        })
+        }
         
-        final_answer = response.content.strip()
+        stream_callback = state.get("stream_callback")
+        if stream_callback:
+            # Stream the answer: the caller sees tokens while the rest is generated
+            parts = []
+            async for chunk in self._format_chain.astream(inputs):
+                stream_callback(chunk.content)
+                parts.append(chunk.content)
+            final_answer = "".join(parts).strip()
+        else:
+            response = await self._format_chain.ainvoke(inputs)
+            final_answer = response.content.strip()
         
-        print(f"  ✓ Answer generated")
+        logger.debug("  ✓ Answer generated")
         
         return {"final_answer": final_answer}
     
-    def reason(self, question: str, verbose: bool = True, max_iterations: int = 3) -> Dict:
+    def reason(self, question: str, verbose: bool = True, max_iterations: int = 3,
+               stream_callback: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Main reasoning method using LangGraph (runs areason to completion).
+        
+        Async callers should await areason() instead: called from a running
+        event loop, this runs areason() on its own loop in a worker thread and
+        blocks the caller's loop until it finishes.
+        
+        Args:
+            question: Natural language question
+            verbose: Print intermediate steps
+            max_iterations: Max refinement iterations
+            stream_callback: Called with each chunk of the final answer as it is
+                generated (e.g. lambda t: print(t, end="", flush=True))
+            
+        Returns:
+            Complete reasoning result with trace
+        """
+        run = self.areason(question, verbose=verbose, max_iterations=max_iterations,
+                           stream_callback=stream_callback)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(run)
+        # asyncio.run can't nest inside a running loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, run).result()
+    
+    async def areason(self, question: str, verbose: bool = True, max_iterations: int = 3,
+                      stream_callback: Optional[Callable[[str], None]] = None) -> Dict:
         """
-        Main reasoning method using LangGraph.
+        Async version of reason() for use inside an event loop.
+        
+        The I/O-bound nodes (retrieval, LLM calls) are coroutines, so concurrent
+        areason calls don't block each other.
         
         Args:
             question: Natural language question
             verbose: Print intermediate steps
             max_iterations: Max refinement iterations
+            stream_callback: Called with each chunk of the final answer as it is generated
             
         Returns:
             Complete reasoning result with trace
         """
-        if verbose:
-            print("\n" + "=" * 80)
-            print("LANGGRAPH REASONING PIPELINE")
-            print("=" * 80)
-            print(f"Question: {question}")
+        with _verbose_logging() if verbose else nullcontext():
+            return await self._areason(question, max_iterations, stream_callback)
+    
+    async def _areason(self, question: str, max_iterations: int,
+                       stream_callback: Optional[Callable[[str], None]]) -> Dict:
+        """Run the graph for one question (logging is set up by areason)."""
+        logger.debug("\n%s\nLANGGRAPH REASONING PIPELINE\n%s", "=" * 80, "=" * 80)
+        logger.debug("Question: %s", question)
         
         # Initialize state
         initial_state = {
             "question": question,
             "retrieved_docs": [],
+            "seen_prologs": set(),
+            "prefetched_docs": [],
+            "doc_counts": {"fact": 0, "rule": 0},
             "relevancy_score": 0.0,
             "relevancy_explanation": "",
             "needs_refinement": False,
@@ -452,12 +879,13 @@ Provide a natural language answer:""")
             "inference_result": False,
             "trace": "",
             "final_answer": "",
+            "stream_callback": stream_callback,
             "iteration": 0,
             "max_iterations": max_iterations
         }
         
         # Run the graph
-        final_state = self.graph.invoke(initial_state)
+        final_state = await self.graph.ainvoke(initial_state)
         
         # Package result
         result = {
@@ -473,14 +901,11 @@ Provide a natural language answer:""")
             "success": True
         }
         
-        if verbose:
-            print("\n" + "=" * 80)
-            print("FINAL RESULT")
-            print("=" * 80)
-            print(f"Result: {result['result']}")
-            print(f"Relevancy Score: {result['relevancy_score']:.2f}")
-            print(f"Refinement Iterations: {result['iterations']}")
-            print(f"\nTrace:\n{result['trace']}")
+        logger.debug("\n%s\nFINAL RESULT\n%s", "=" * 80, "=" * 80)
+        logger.debug("Result: %s", result['result'])
+        logger.debug("Relevancy Score: %.2f", result['relevancy_score'])
+        logger.debug("Refinement Iterations: %d", result['iterations'])
+        logger.debug("\nTrace:\n%s", result['trace'])
         
         return result
 